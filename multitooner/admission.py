@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.admission module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The admission module for the MultiTooner application. Decides when it
+is a good time to start another game client, based on the load of the
+system.
+'''
+
+import collections
+import os
+import re
+import subprocess
+import time
+
+
+class AdmissionController:
+    '''Decides whether another game client may be started right now.
+
+    Starting many clients at the same moment makes every one of them
+    load slower, so a client is only admitted when the system has
+    capacity for it: fewer clients than the ceiling are still booting,
+    the load average is below its ceiling and enough memory is free.
+    A client is always admitted if no other client is booting, so that
+    launching can never stall indefinitely.
+
+    Whether a client is booting isn't measured: a client simply counts
+    as booting for a fixed boot_time after it was started, however
+    long it actually takes to load.
+
+    Args:
+        max_booting (int):
+            The maximum number of clients that may be booting at once.
+            Defaults to 2.
+        max_load (int or float):
+            The maximum one-minute load average. Defaults to 0, in
+            which case the number of CPUs is used.
+        min_free_memory (int):
+            The minimum free memory, in megabytes. Defaults to 512.
+        boot_time (int or float):
+            The number of seconds a client is considered to be booting
+            after it is started. Defaults to 30.
+    '''
+
+    def __init__(self, max_booting=2, max_load=0, min_free_memory=512,
+                 boot_time=30):
+        '''Please see help(AdmissionController) for more info.'''
+
+        # Store parameters
+        self.max_booting = max_booting
+        self.max_load = max_load
+        self.min_free_memory = min_free_memory
+        self.boot_time = boot_time
+
+        # Keep the times that recent clients were started at
+        self._spawns = collections.deque()
+
+    @property
+    def max_load(self):
+        '''Returns the maximum one-minute load average.'''
+
+        return self._max_load
+
+    @max_load.setter
+    def max_load(self, value):
+        '''Sets the maximum load average, using the CPU count for 0.'''
+
+        self._max_load = value or os.cpu_count() or 1
+
+    @property
+    def booting(self):
+        '''Returns the number of clients that are still booting.'''
+
+        # Forget about clients that have finished booting
+        cutoff = time.monotonic() - self.boot_time
+        while self._spawns and self._spawns[0] < cutoff:
+            self._spawns.popleft()
+        return len(self._spawns)
+
+    def record_spawn(self):
+        '''Notes that a client was just started.'''
+
+        self._spawns.append(time.monotonic())
+
+    def admit(self):
+        '''Returns whether or not another client may be started now.'''
+
+        # Always admit a client when nothing else is booting
+        booting = self.booting
+        if not booting:
+            return True
+        # Check the cheapest conditions first
+        if booting >= self.max_booting:
+            return False
+        if os.getloadavg()[0] >= self.max_load:
+            return False
+        free_memory = get_free_memory()
+        return free_memory is None or free_memory >= self.min_free_memory
+
+
+def get_free_memory():
+    '''Returns the available memory in megabytes, or None if unknown.
+
+    On macOS, free, inactive and speculative pages are counted as
+    available, since the system reclaims them on demand.
+    '''
+
+    # Use sysconf where it's supported, such as on Linux
+    try:
+        pages = os.sysconf('SC_AVPHYS_PAGES')
+        return pages * os.sysconf('SC_PAGE_SIZE') // 2**20
+    except (ValueError, OSError, AttributeError):
+        pass
+
+    # Otherwise, parse the output of vm_stat on macOS
+    try:
+        output = subprocess.run(
+            ['vm_stat'],
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    page_size = re.search(r'page size of (\d+) bytes', output)
+    pages = re.findall(
+        r'Pages (?:free|inactive|speculative):\s+(\d+)',
+        output,
+    )
+    if not page_size or not pages:
+        return None
+    return sum(map(int, pages)) * int(page_size.group(1)) // 2**20
@@ -8,17 +8,40 @@ The menu bar module for the MultiTooner application. Includes all menu bar
 functionality.
 '''
 
+import atexit
+import collections
 import configparser
 import os
 import pathlib
+import sys
+import threading
+import time
 
+import requests
 import rumps
-import tooner
+from PyObjCTools import AppHelper
 
+import admission
 import authenticate
+import breaker
+import bulk
 import config
+import control
+import diagnostics
+import estimator
+import events
+import health
+import install
+import instance
+import integrity
+import invasions
+import launcher
 import login
 import preferences
+import replay
+import snapshot
+import watchdog
+import watcher
 
 
 def update_menu(function):
@@ -49,18 +72,130 @@ class MenuBar(rumps.App):
 
         # Get the application support directory of the toontown engine
         self._toontown = rumps.application_support('Toontown Rewritten')
+        self._manifest = install.InstallManifest(
+            self._toontown,
+            self['manifest.json'],
+        )
+        self._prewarm_thread = None
+        self._integrity = integrity.IntegrityVerifier(
+            self._toontown,
+            self['hashes.json'],
+        )
+        self._integrity_thread = None
+
+        # Show the menu from the last snapshot if there is one, and only 
+        # open the configuration file and check the system once it is shown
+        self._snapshot_path = self[snapshot.FILENAME]
+        state = snapshot.load(self._snapshot_path)
+        if state and set(config.DEFAULTS) <= set(state['settings']):
+            self.config = snapshot.ConfigurationSnapshot(
+                state,
+                self[config.FILENAME],
+                load=self._load_config,
+            )
+            self._login_state = state['login']
+            AppHelper.callAfter(self._reconcile)
+        else:
+            state = None
+            self.config = config.Configuration(self, config.FILENAME)
+            self._login_state = None
+        self._snapshot_saved = None
+
+        # Log events to a rotating file and dump recent ones on crashes
+        events.configure(
+            self['multitooner.log'],
+            level=self.config.get_setting('log_level'),
+        )
+        events.install_crash_handler(self)
+        atexit.register(events.shutdown)
+        self._login = login.get_backend(self.config.get_setting('login'))
+        if state is None:
+            self._check_login()
+
+        # Warm start from the last known invasions so they aren't announced
+        self._invasion_state = self['invasions.json']
+        self._invasion_saved = 0
+        self._invasion_details = {}
+        self._invasion_ends = {}
+        self._warm_start_age = self.config.get_setting('warm_start_age')
+        self._invasions = invasions.load_state(
+            self._invasion_state,
+            self._warm_start_age,
+        )
+        self._diagnostics = diagnostics.MemoryDiagnostics(
+            predicates={
+                'Menu items': lambda o: isinstance(o, rumps.MenuItem),
+                'Launch closures': lambda o: (
+                    getattr(o, '__qualname__', None)
+                    == 'MenuBar.launch.<locals>.wrapped'
+                ),
+            },
+            gauges={'Invasion records': lambda: len(self._invasions)},
+        )
+
+        # Watch for stalls of the main thread by pinging it
+        self._watchdog = watchdog.StallWatchdog(
+            self['stalls.log'],
+            post=AppHelper.callAfter,
+            threshold=self.config.get_setting('stall_threshold') / 1000,
+        )
 
-        # Initialize the configuration file and menu
-        self.config = config.Configuration(self, 'config.ini')
         self.initialize_menu()
 
+        # Initialize the queue of accounts waiting to be launched
+        self._admission = admission.AdmissionController(
+            max_booting=self.config.get_setting('max_booting'),
+            max_load=self.config.get_setting('max_load'),
+            min_free_memory=self.config.get_setting('min_free_memory'),
+            boot_time=self.config.get_setting('boot_time'),
+        )
+        self._launch_queue = collections.deque()
+        self._launch_listeners = collections.defaultdict(list)
+        self._admission_timer = rumps.Timer(self._admit_next, 0.5)
+
+        # Initialize the credential checker used to verify accounts
+        self._checker = health.CredentialChecker(
+            max_workers=self.config.get_setting('verify_workers'),
+            ttl=self.config.get_setting('verify_ttl'),
+        )
+        self._verifying = {}
+
         # Initialize the invasion tracker and start if necessary
         self._interval = self.config.get_setting('interval')
         self._invasion_timer = rumps.Timer(self._get_invasions, self._interval)
-        self._tracker = tooner.InvasionTracker()
-        self._invasions = {}
+        self._tracker = invasions.InvasionTracker()
+        self._replay = None
+        self._estimator = estimator.InvasionEstimator()
+        self._ending_soon = self.config.get_setting('ending_soon')
+        self._ending_alerted = set()
+        self._invasions_menu = invasions.InvasionsMenu(self._invasions_option)
         if self._track_option.state:
             self._invasion_timer.start()
+            # Show the invasions from the snapshot until the first poll
+            if state and time.time() - state['time'] <= self._warm_start_age:
+                self._invasion_details = state['invasions']
+                self._invasions_menu.update(self._invasion_details)
+        else:
+            self._invasions_menu.clear('Invasion Notifications Are Off')
+
+        # Show when the Toontown Rewritten API is failing
+        self._unavailable_option = None
+        breaker.TTR_API.on_change = lambda state: AppHelper.callAfter(
+            self._update_service_status,
+            state,
+        )
+
+        # Watch the configuration file for changes made outside of the app
+        self._config_watcher = watcher.FileWatcher(
+            self.config.path,
+            lambda: AppHelper.callAfter(self._config_changed),
+        )
+        self._config_watcher.start()
+
+        # Let local scripts drive the application if the user wants to
+        self._control_server = None
+        if self.config.get_setting('control'):
+            self._start_control_server()
 
     def __getitem__(self, item):
         '''Returns path to an item in the Application Support folder.
@@ -81,6 +216,227 @@ class MenuBar(rumps.App):
 
         return self.config.accounts
 
+    def record_invasions(self, path):
+        '''Records every response of the invasion tracker to a file.
+
+        Args:
+            path (str):
+                The path to the recording.
+        '''
+
+        self._tracker = replay.InvasionRecorder(self._tracker, path)
+        atexit.register(self._tracker.close)
+
+    def replay_invasions(self, path, speed=1):
+        '''Replaces the invasion tracker with a recording.
+
+        The recorded polls are fed through the same notification and 
+        menu path as live ones, at the recorded pace divided by the 
+        speed. The invasion tracker isn't polled while replaying.
+
+        Args:
+            path (str):
+                The path to the recording.
+            speed (int or float):
+                How many times faster than real time to replay the 
+                recording. Defaults to 1.
+        '''
+
+        self._invasion_state = None
+        self._invasions = {}
+        self._estimator = estimator.InvasionEstimator()
+        self._invasions_menu.clear()
+        self._replay = replay.ReplayScheduler(
+            path,
+            lambda timestamp, details: AppHelper.callAfter(
+                self._process_invasions,
+                details,
+                timestamp,
+            ),
+            speed=speed,
+        )
+        self._replay.start()
+
+    def listen(self, path):
+        '''Accepts intents forwarded by other launches of the application.
+
+        Args:
+            path (str):
+                The full path to the socket to listen on.
+        '''
+
+        self._instance_server = instance.InstanceServer(
+            path,
+            lambda intent: AppHelper.callAfter(self.handle_intent, intent),
+        )
+        self._instance_server.start()
+
+    def handle_intent(self, intent):
+        '''Does what another launch of the application asked for.
+
+        Args:
+            intent (dict):
+                The intent, whose "command" is either "activate" or 
+                "launch". A "launch" may name "accounts" to launch, and 
+                launches every account if it doesn't. Please see 
+                help(instance.validate_intent) for more info.
+        '''
+
+        intent = instance.validate_intent(intent)
+        events.info(
+            'instance.intent',
+            command=intent['command'],
+            accounts=intent['accounts'],
+        )
+        if intent['command'] == 'launch':
+            self.launch_accounts(intent['accounts'] or self.accounts)
+        else:
+            rumps.notification(
+                title='MultiTooner is already running',
+                subtitle=None,
+                message='You can find it in the menu bar.',
+            )
+
+    def handle_command(self, command, responses):
+        '''Runs a command sent through the control server.
+
+        The responses are put on the queue as the command runs, followed 
+        by control.FINISHED (see help(control.ControlServer) for more 
+        info). FINISHED is queued even if the command fails, along with 
+        the error.
+
+        Args:
+            command (dict):
+                The command, whose "command" is "launch", "status" or 
+                "invasions". A "launch" may name "accounts" to launch, 
+                and launches every account if it doesn't. Its progress 
+                is reported for each account as it is queued, launched 
+                or skipped.
+            responses (queue.Queue):
+                The queue to put the command's responses on.
+        '''
+
+        name = command.get('command')
+        events.info('control.command', command=name)
+        if name == 'launch':
+            self._handle_launch_command(command, responses)
+            return
+        try:
+            self._run_command(name, responses)
+        except Exception as error:
+            events.record_crash(*sys.exc_info())
+            responses.put({'error': str(error)})
+        finally:
+            responses.put(control.FINISHED)
+
+    def _handle_launch_command(self, command, responses):
+        '''Launches the accounts of a command from the control server.
+
+        control.FINISHED is queued once every account reached its final 
+        state, or straight away if the launch failed.
+
+        Args:
+            command (dict):
+                The command, which may name "accounts" to launch.
+            responses (queue.Queue):
+                The queue to put the command's responses on.
+        '''
+
+        names = command.get('accounts') or self.accounts
+        if not isinstance(names, list) or not all(
+            isinstance(name, str) for name in names
+        ):
+            responses.put({'error': 'accounts must be a list of names'})
+            responses.put(control.FINISHED)
+            return
+        pending = set(names)
+
+        def progress(account, state, final):
+            if account not in pending:
+                return
+            responses.put({'account': account, 'state': state})
+            if final:
+                pending.discard(account)
+                if not pending:
+                    responses.put(control.FINISHED)
+
+        if not pending:
+            responses.put(control.FINISHED)
+            return
+        try:
+            self.launch_accounts(list(dict.fromkeys(names)), progress)
+        except Exception as error:
+            events.record_crash(*sys.exc_info())
+            # Stop reporting to a command that has already finished
+            for account in list(self._launch_listeners):
+                listeners = self._launch_listeners[account]
+                if progress in listeners:
+                    listeners.remove(progress)
+                if not listeners:
+                    del self._launch_listeners[account]
+            if pending:
+                pending.clear()
+                responses.put({'error': str(error)})
+                responses.put(control.FINISHED)
+
+    def _run_command(self, name, responses):
+        '''Puts the responses of a command that finishes straight away.
+
+        Args:
+            name (str):
+                The name of the command, either "status" or "invasions".
+            responses (queue.Queue):
+                The queue to put the command's responses on.
+        '''
+
+        if name == 'status':
+            responses.put({
+                'accounts': self.accounts,
+                'queued': list(self._launch_queue),
+                'booting': self._admission.booting,
+                'tracking': bool(self._track_option.state),
+                'service': breaker.TTR_API.state,
+            })
+        elif name == 'invasions':
+            responses.put({
+                'invasions': {
+                    district: {
+                        'cog': cog,
+                        'progress': progress,
+                        'ends': self._invasion_ends.get(district),
+                    }
+                    for district, (cog, progress)
+                    in self._invasion_details.items()
+                },
+            })
+        else:
+            responses.put({'error': f'unknown command: {name}'})
+
+    def _start_control_server(self):
+        '''Starts accepting commands from local scripts.
+
+        Scripts authenticate with the token in the Application Support 
+        folder, which is created the first time the server starts.
+        '''
+
+        self._control_server = control.ControlServer(
+            self[control.SOCKET_FILENAME],
+            control.get_token(self[control.TOKEN_FILENAME]),
+            lambda command, responses: AppHelper.callAfter(
+                self.handle_command,
+                command,
+                responses,
+            ),
+        )
+        self._control_server.start()
+
+    def _stop_control_server(self):
+        '''Stops accepting commands from local scripts.'''
+
+        if self._control_server is not None:
+            self._control_server.stop()
+            self._control_server = None
+
     def start(self, debug=False):
         '''Start the application.
         
@@ -108,6 +464,11 @@ class MenuBar(rumps.App):
             callback=self.launch_all,
         )
         self.menu.add(self._launch_all_option)
+        self._verify_option = rumps.MenuItem(
+            'Verify All Accounts',
+            callback=self.verify_all_accounts,
+        )
+        self.menu.add(self._verify_option)
         self.menu.add(None)
 
         # Create a menu item for each account in the config file
@@ -116,6 +477,10 @@ class MenuBar(rumps.App):
             self.menu.add(item)
         self.menu.add(None)
 
+        # Make a nested menu of current invasions
+        self._invasions_option = rumps.MenuItem('Current Invasions')
+        self.menu.add(self._invasions_option)
+
         # Make a nested preferences menu
         preferences = rumps.MenuItem('Preferences')
         preferences.add(rumps.MenuItem(
@@ -128,6 +493,21 @@ class MenuBar(rumps.App):
         )
         preferences.add(self._remove_account_option)
         preferences.add(None)
+        preferences.add(rumps.MenuItem(
+            'Import Accounts...',
+            callback=self.import_accounts,
+        ))
+        self._export_accounts_option = rumps.MenuItem(
+            'Export Accounts...',
+            callback=self.export_accounts,
+        )
+        preferences.add(self._export_accounts_option)
+        preferences.add(None)
+        preferences.add(rumps.MenuItem(
+            'Verify Game Files',
+            callback=self.verify_game_files,
+        ))
+        preferences.add(None)
         self._track_option = rumps.MenuItem(
             'Invasion Notifications',
             callback=self.toggle_invasion_notifications,
@@ -140,8 +520,65 @@ class MenuBar(rumps.App):
         )
         preferences.add(self._login_option)
         self.menu.add(preferences)
+
+        # Make a nested debug menu if diagnostics are enabled
+        if self.config.get_setting('diagnostics'):
+            self._initialize_debug_menu()
         self.menu.add(None)
 
+    def _update_service_status(self, state):
+        '''Shows or hides the "Service Unavailable" status item.
+
+        The item is shown at the top of the menu for as long as the 
+        circuit breaker of the Toontown Rewritten API isn't closed.
+
+        Args:
+            state (str):
+                The new state of the circuit breaker.
+        '''
+
+        events.info('breaker.state', state=state)
+        if state != breaker.CLOSED and self._unavailable_option is None:
+            self._unavailable_option = rumps.MenuItem(
+                'Toontown Rewritten Is Unavailable',
+            )
+            self.menu.insert_before('Launch All', self._unavailable_option)
+        elif state == breaker.CLOSED and self._unavailable_option:
+            self.menu.pop(self._unavailable_option.title)
+            self._unavailable_option = None
+
+    def _initialize_debug_menu(self):
+        '''Creates the nested debug menu and starts sampling memory.'''
+
+        debug = rumps.MenuItem('Debug')
+        self._memory_option = rumps.MenuItem('Memory: Not Sampled Yet')
+        debug.add(self._memory_option)
+        self._stalls_option = rumps.MenuItem(self._watchdog.summary)
+        debug.add(self._stalls_option)
+        debug.add(None)
+        self._trace_option = rumps.MenuItem(
+            'Trace Allocations',
+            callback=self.toggle_allocation_tracing,
+        )
+        debug.add(self._trace_option)
+        debug.add(rumps.MenuItem(
+            'Take Snapshot',
+            callback=self.take_memory_snapshot,
+        ))
+        debug.add(rumps.MenuItem(
+            'Dump Diagnostics',
+            callback=self.dump_diagnostics,
+        ))
+        self.menu.add(debug)
+
+        # Only watch for stalls while diagnosing the application
+        self._watchdog.start()
+
+        # Sample the memory footprint every minute
+        self._memory_timer = rumps.Timer(self._sample_memory, 60)
+        self._memory_timer.start()
+        self._sample_memory(self._memory_timer)
+
     def update_menu_items(self):
         '''Updates and refreshes menu items.
 
@@ -165,7 +602,137 @@ class MenuBar(rumps.App):
             self._remove_account_option,
             self.remove_account,
         )
+        self._disable_if_no_accounts(
+            self._export_accounts_option,
+            self.export_accounts,
+        )
+        self._disable_if_no_accounts(
+            self._verify_option,
+            self.verify_all_accounts,
+        )
+
+        # Remember what the menu shows for the next launch
+        self._save_snapshot()
+
+    def _save_snapshot(self, force=False):
+        '''Saves what the menu currently shows for the next launch.
+
+        Nothing is saved until the configuration file has been opened, 
+        or if the menu shows the same as when it was last saved.
+
+        Args:
+            force (bool):
+                Whether or not to save even if nothing changed, which 
+                keeps the saved invasions fresh. Defaults to False.
+        '''
+
+        if isinstance(self.config, snapshot.ConfigurationSnapshot):
+            return
+        rendered = (
+            self.accounts,
+            self.config.settings,
+            self._login_option.state == 1,
+            dict(self._invasion_details),
+        )
+        if rendered == self._snapshot_saved and not force:
+            return
+        accounts, settings, login, details = rendered
+        snapshot.save(
+            self._snapshot_path,
+            accounts=accounts,
+            settings=settings,
+            login=login,
+            details=details,
+        )
+        self._snapshot_saved = rendered
+
+    def _load_config(self):
+        '''Opens the configuration file before the menu was reconciled.
+
+        Called by the snapshot when something needs more than it saved, 
+        such as an account's login information.
+        '''
+
+        self._reconcile()
+        return self.config
+
+    @update_menu
+    def _reconcile(self):
+        '''Replaces the snapshot with the real configuration.
+
+        Opens the configuration file and only applies what differs from 
+        the snapshot the menu was shown from. Whether the application 
+        runs at login is checked on a background thread. Nothing happens 
+        if the configuration file was already opened.
+        '''
+
+        provisional = self.config
+        if not isinstance(provisional, snapshot.ConfigurationSnapshot):
+            return
+        self.config = config.Configuration(self, config.FILENAME)
+        changes = self.config.compare(
+            provisional.accounts,
+            provisional.settings,
+        )
+        events.info(
+            'snapshot.reconcile',
+            added=changes.added,
+            removed=changes.removed,
+            settings=sorted(changes.settings),
+        )
+        self._apply_changes(changes)
+
+        # Check the run at login state without holding up the menu
+        self._check_login()
+
+    def _check_login(self):
+        '''Checks whether the application runs at login in the background.
+
+        The login item of older versions is migrated first, so that 
+        upgrading doesn't silently stop the application running at login. 
+        Looking for it means enumerating every login item, so it is only 
+        ever done once.
+        '''
+
+        backend = self._login
+        migrate = not self.config.get_setting('login_migrated')
+
+        def check():
+            migrated = False
+            try:
+                if migrate:
+                    backend.migrate()
+                    migrated = True
+                enabled = backend.is_enabled()
+            except Exception as error:
+                events.warning('login.error', error=str(error))
+                enabled = None
+            AppHelper.callAfter(self._show_login_state, enabled, migrated)
+
+        threading.Thread(target=check, daemon=True).start()
+
+    def _show_login_state(self, enabled, migrated=False):
+        '''Shows whether the application actually runs at login.
 
+        Args:
+            enabled (bool):
+                Whether or not the application runs at login, or None 
+                if it couldn't be checked.
+            migrated (bool):
+                Whether or not the login item of older versions was 
+                just migrated. Defaults to False.
+        '''
+
+        if migrated:
+            self.config.set_setting('login_migrated', 1)
+        self._login_state = None
+        if enabled is None:
+            return
+        if self._login_option.state != int(enabled):
+            self._update_option(self._login_option, enabled)
+        self._save_snapshot()
+
+    @events.dump_on_error
     def toggle_invasion_notifications(self, sender):
         '''Toggles whether or not the application will run at login.
 
@@ -193,10 +760,14 @@ class MenuBar(rumps.App):
         self.config.set_setting('invasions', sender.state)
         # Toggle the invasion timer appropriately
         if sender.state:
+            self._invasions_menu.clear()
             self._invasion_timer.start()
         else:
             self._invasion_timer.stop()
+            self._invasions_menu.clear('Invasion Notifications Are Off')
+        self._save_snapshot()
 
+    @events.dump_on_error
     def toggle_run_at_login(self, sender):
         '''Toggles whether or not the application will run at login.
 
@@ -222,10 +793,17 @@ class MenuBar(rumps.App):
         sender.state = int(not sender.state)
         # Toggle running at login appropriately
         if sender.state:
-            login.enable_run_at_login()
+            self._login.enable()
         else:
-            login.disable_run_at_login()
+            self._login.disable()
+        events.info(
+            'login.toggle',
+            enabled=bool(sender.state),
+            backend=type(self._login).__name__,
+        )
+        self._save_snapshot()
 
+    @events.dump_on_error
     @update_menu
     def add_account(self, sender):
         '''Adds an account.
@@ -253,6 +831,7 @@ class MenuBar(rumps.App):
             )
             self.menu.insert_before('SeparatorMenuItem_2', item)
 
+    @events.dump_on_error
     @update_menu
     def remove_account(self, sender):
         '''Removes an account.
@@ -276,6 +855,283 @@ class MenuBar(rumps.App):
             self.config.remove_account(*response)
             self.menu.pop(response[0])
 
+    @events.dump_on_error
+    @update_menu
+    def import_accounts(self, sender):
+        '''Imports accounts from a CSV or JSON file.
+
+        Launches a window where the user can specify the file to import 
+        from. The whole file is validated before anything is added, and 
+        then every account is added to the configuration file in a 
+        single write and to the end of the accounts section of the menu.
+
+        Args:
+            sender (rumps.MenuItem):
+                Automatically sent when a menu item is invoked, and 
+                is essentially a reference to the invoked menu item.
+        '''
+
+        # Launch the Import Accounts window and get the validated accounts
+        window = preferences.ImportAccounts(self)
+        response = window.get_input()
+        # If the input is valid, add every account at once
+        if response:
+            self.config.add_accounts(response)
+            for name, _, _ in response:
+                item = rumps.MenuItem(name, callback=self.launch(name))
+                self.menu.insert_before('SeparatorMenuItem_2', item)
+
+    @events.dump_on_error
+    def export_accounts(self, sender):
+        '''Exports all configured accounts to a CSV or JSON file.
+
+        Args:
+            sender (rumps.MenuItem):
+                Automatically sent when a menu item is invoked, and 
+                is essentially a reference to the invoked menu item.
+        '''
+
+        # Launch the Export Accounts window and get the user's input
+        window = preferences.ExportAccounts(self)
+        response = window.get_input()
+        # If the input is valid, write every account to the file
+        if response:
+            accounts = [
+                (name, *self.config.get_account(name))
+                for name in self.accounts
+            ]
+            bulk.write_accounts(response, accounts)
+
+    def _config_changed(self):
+        '''Reloads the configuration file if something else changed it.
+
+        The watcher also notices the application's own saves, which 
+        don't need to be reloaded.
+        '''
+
+        if self.config.changed_elsewhere():
+            self.reload_config()
+
+    @update_menu
+    def reload_config(self):
+        '''Applies changes made to the configuration file elsewhere.
+
+        Reloads the configuration file and only applies what changed: 
+        account items are added or removed, and the invasion timer and 
+        run at login backend are updated if their settings changed.
+        '''
+
+        changes = self.config.reload()
+        events.info(
+            'config.reload',
+            added=changes.added,
+            removed=changes.removed,
+            settings=sorted(changes.settings),
+        )
+        self._apply_changes(changes)
+
+    def _apply_changes(self, changes):
+        '''Applies the differences in the configuration to the menu.
+
+        Args:
+            changes (config.Changes):
+                The accounts that were added and removed, and the 
+                settings that changed.
+        '''
+
+        # Add and remove the account items that changed
+        for name in changes.removed:
+            self.menu.pop(name)
+        for name in changes.added:
+            item = rumps.MenuItem(name, callback=self.launch(name))
+            self.menu.insert_before('SeparatorMenuItem_2', item)
+
+        # Switch the run at login backend if it changed
+        if 'login' in changes.settings:
+            self._login = login.get_backend(changes.settings['login'])
+
+        # Update the admission controller's ceilings if they changed
+        for option in ('max_booting', 'max_load', 'min_free_memory',
+                       'boot_time'):
+            if option in changes.settings:
+                setattr(self._admission, option, changes.settings[option])
+
+        # Update the maximum age of the saved invasions if it changed
+        if 'warm_start_age' in changes.settings:
+            self._warm_start_age = changes.settings['warm_start_age']
+
+        # Update when to alert of invasions ending soon if it changed
+        if 'ending_soon' in changes.settings:
+            self._ending_soon = changes.settings['ending_soon']
+
+        # Update the stall threshold if it changed
+        if 'stall_threshold' in changes.settings:
+            threshold = changes.settings['stall_threshold']
+            self._watchdog.threshold = threshold / 1000
+
+        # Update the level of logged events if it changed
+        if 'log_level' in changes.settings:
+            events.set_level(changes.settings['log_level'])
+
+        # Start or stop the control server if its setting changed
+        if 'control' in changes.settings:
+            if changes.settings['control']:
+                if self._control_server is None:
+                    self._start_control_server()
+            else:
+                self._stop_control_server()
+
+        # Update the invasion timer if its settings changed
+        if 'interval' in changes.settings:
+            # A running rumps.Timer may ignore a new interval, so restart it
+            self._interval = changes.settings['interval']
+            running = self._invasion_timer.is_alive()
+            self._invasion_timer.stop()
+            self._invasion_timer.interval = self._interval
+            if running:
+                self._invasion_timer.start()
+        if 'invasions' in changes.settings:
+            if not changes.settings['invasions']:
+                self._invasion_timer.stop()
+                self._invasions_menu.clear('Invasion Notifications Are Off')
+            elif not self._invasion_timer.is_alive():
+                self._invasions_menu.clear()
+                self._invasion_timer.start()
+
+    @events.dump_on_error
+    def toggle_allocation_tracing(self, sender):
+        '''Toggles whether or not allocations are traced.
+
+        Tracing allocations with tracemalloc has a cost, so it is only 
+        done while the "Trace Allocations" menu item is checked.
+
+        Args:
+            sender (rumps.MenuItem):
+                Automatically sent when a menu item is invoked, and 
+                is essentially a reference to the invoked menu item.
+        '''
+
+        if self._diagnostics.tracing:
+            self._diagnostics.stop_tracing()
+        else:
+            self._diagnostics.start_tracing()
+        sender.state = int(self._diagnostics.tracing)
+
+    @events.dump_on_error
+    def take_memory_snapshot(self, sender):
+        '''Takes an allocation snapshot to compare against later.
+
+        Args:
+            sender (rumps.MenuItem):
+                Automatically sent when a menu item is invoked, and 
+                is essentially a reference to the invoked menu item.
+        '''
+
+        self._diagnostics.take_snapshot()
+        self._trace_option.state = int(self._diagnostics.tracing)
+
+    @events.dump_on_error
+    def dump_diagnostics(self, sender):
+        '''Writes a diagnostics report to the Application Support folder.
+
+        Args:
+            sender (rumps.MenuItem):
+                Automatically sent when a menu item is invoked, and 
+                is essentially a reference to the invoked menu item.
+        '''
+
+        filename = time.strftime('diagnostics-%Y%m%d-%H%M%S.txt')
+        self._diagnostics.dump(self[filename])
+        rumps.notification(
+            title='Diagnostics dumped',
+            subtitle=None,
+            message=f'The report was saved as {filename}.',
+        )
+
+    @events.dump_on_error
+    def _sample_memory(self, sender):
+        '''Samples the memory footprint and shows it in the debug menu.
+
+        The summary of main thread stalls is refreshed at the same time.
+
+        Args:
+            sender (rumps.Timer):
+                Automatically sent when the timer fires.
+        '''
+
+        self._diagnostics.sample()
+        if self._diagnostics.history:
+            rss = self._diagnostics.history[-1][1]
+            self._memory_option.title = f'Memory: {rss / 2**20:.1f} MB'
+        if self._stalls_option.title != self._watchdog.summary:
+            self._stalls_option.title = self._watchdog.summary
+
+    @events.dump_on_error
+    def verify_all_accounts(self, sender):
+        '''Verifies the login information of every account.
+
+        Every account is checked against the login API concurrently, 
+        without launching the game. Accounts whose login information 
+        is rejected are marked in the menu and skipped by "Launch All".
+
+        Args:
+            sender (rumps.MenuItem):
+                Automatically sent when a menu item is invoked, and 
+                is essentially a reference to the invoked menu item.
+        '''
+
+        # Ignore the request if a verification is already running
+        if self._verifying:
+            return
+        # Read the login information of every account on the main thread
+        accounts = {
+            name: self.config.get_account(name)
+            for name in self.accounts
+        }
+        self._verifying = dict.fromkeys(accounts)
+        self._checker.check_all(
+            accounts,
+            lambda name, result: AppHelper.callAfter(
+                self._finish_verification,
+                name,
+                result,
+            ),
+        )
+
+    def _finish_verification(self, name, result):
+        '''Marks a verified account and notifies once all are verified.
+
+        Args:
+            name (str):
+                The name of the verified account.
+            result (str):
+                The result of the verification (see the health module).
+        '''
+
+        # Mark the account in the menu if its login information was rejected
+        self._verifying[name] = result
+        if name in self.accounts:
+            title = name
+            if result == health.INVALID:
+                title = f'{name} (Login Failed)'
+            if self.menu[name].title != title:
+                self.menu[name].title = title
+
+        # Summarize the results once every account has been verified
+        if None in self._verifying.values():
+            return
+        results = list(self._verifying.values())
+        self._verifying = {}
+        rumps.notification(
+            title='Accounts verified',
+            subtitle=None,
+            message=(
+                f'{results.count(health.VALID)} valid, '
+                f'{results.count(health.INVALID)} failed, '
+                f'{results.count(health.UNKNOWN)} could not be checked.'
+            ),
+        )
+
     def launch(self, name):
         '''Launches the specified account.
 
@@ -289,23 +1145,49 @@ class MenuBar(rumps.App):
                 file.
         '''
 
+        @events.dump_on_error
         def wrapped(sender=None):
+            events.info('launch.start', account=name)
+            start = time.monotonic()
             # Read the login information for the first toon
             username, password = self.config.get_account(name)
             # Launch the game
-            launcher = tooner.ToontownLauncher(self._toontown)
-            success = launcher.play(username=username, password=password)
-            if success is None:
-                window = authenticate.AuthenticationWindow(self, name)
-                response = window.get_input()
-                if response:
-                    launcher.play(
-                        username=username,
-                        password=password,
-                        appToken=response,
-                    )
+            game = launcher.Launcher(self._toontown)
+            try:
+                success = game.play(username=username, password=password)
+                if not success:
+                    window = authenticate.AuthenticationWindow(self, name)
+                    response = window.get_input()
+                    if response:
+                        success = game.play(
+                            username=username,
+                            password=password,
+                            appToken=response,
+                        )
+            except breaker.CircuitOpenError as error:
+                # Fail fast while the Toontown Rewritten API is down
+                success = False
+                rumps.notification(
+                    title='Toontown Rewritten is unavailable',
+                    subtitle=None,
+                    message=f'{name} was not launched. {error}',
+                )
+            except (requests.RequestException, ValueError) as error:
+                success = False
+                events.warning('launch.error', account=name, error=str(error))
+            # Let the admission controller know that a client is booting
+            if success:
+                self._admission.record_spawn()
+            events.info(
+                'launch.finish',
+                account=name,
+                launched=bool(success),
+                seconds=round(time.monotonic() - start, 3),
+            )
+            return success
         return wrapped
 
+    @events.dump_on_error
     def launch_all(self, sender):
         '''Launches all configured accounts.
 
@@ -315,8 +1197,222 @@ class MenuBar(rumps.App):
                 is essentially a reference to the invoked menu item.
         '''
 
-        for account in self.accounts:
-            self.launch(account)()
+        self.launch_accounts(self.accounts)
+
+    def launch_accounts(self, names, progress=None):
+        '''Launches the specified accounts.
+
+        Accounts whose login information recently failed verification 
+        are skipped. Rather than starting every client at the same 
+        moment, the accounts are queued and admitted one at a time as 
+        the system has capacity for them (see 
+        help(admission.AdmissionController) for more info).
+
+        Args:
+            names (list):
+                The names of the configured accounts to launch.
+            progress (function):
+                A function to call with each account's name, its state 
+                ("unknown", "skipped", "queued", "launching", "launched" 
+                or "failed") and whether that state is its last. 
+                Defaults to None.
+        '''
+
+        # Verify the game's files first if the user wants to
+        if self.config.get_setting('verify_install'):
+            self._start_integrity_check()
+
+        # Read the game's files into memory while the first clients log in
+        if self.config.get_setting('prewarm'):
+            self._start_prewarm()
+
+        # Queue every account that isn't waiting and didn't fail verification
+        accounts = self.accounts
+        for account in names:
+            if account not in accounts:
+                if progress:
+                    progress(account, 'unknown', True)
+                continue
+            if account not in self._launch_queue:
+                result = self._checker.get_result(
+                    account,
+                    *self.config.get_account(account),
+                )
+                if result == health.INVALID:
+                    if progress:
+                        progress(account, 'skipped', True)
+                    continue
+                self._launch_queue.append(account)
+            if progress:
+                self._launch_listeners[account].append(progress)
+                progress(account, 'queued', False)
+        # Start admitting accounts, beginning with the first one right away
+        if not self._admission_timer.is_alive():
+            self._admission_timer.start()
+        self._admit_next(self._admission_timer)
+
+    @events.dump_on_error
+    def verify_game_files(self, sender):
+        '''Verifies the game's files and repairs any that are broken.
+
+        Args:
+            sender (rumps.MenuItem):
+                Automatically sent when a menu item is invoked, and 
+                is essentially a reference to the invoked menu item.
+        '''
+
+        self._start_integrity_check()
+
+    def _start_integrity_check(self):
+        '''Verifies the game's files on a background thread.
+
+        Nothing happens if the files are already being verified. While 
+        they are, queued accounts are not launched.
+        '''
+
+        if self._integrity_thread and self._integrity_thread.is_alive():
+            return
+        self._integrity_thread = threading.Thread(
+            target=self._check_integrity,
+            daemon=True,
+        )
+        self._integrity_thread.start()
+
+    def _check_integrity(self):
+        '''Verifies and repairs the game's files against the manifest.'''
+
+        start = time.monotonic()
+        try:
+            manifest = self._integrity.fetch_manifest()
+            problems = self._integrity.verify(manifest)
+            failed = self._integrity.repair(manifest, problems)
+        except (OSError, ValueError, requests.RequestException) as error:
+            events.warning('install.error', error=str(error))
+            problems, failed = None, None
+        events.info(
+            'install.verify',
+            problems=problems,
+            failed=failed,
+            seconds=round(time.monotonic() - start, 3),
+        )
+        AppHelper.callAfter(self._finish_integrity_check, problems, failed)
+
+    def _finish_integrity_check(self, problems, failed):
+        '''Notifies the user of the result of verifying the game's files.
+
+        Args:
+            problems (dict or None):
+                The files that were missing or corrupt, or None if the 
+                files could not be verified.
+            failed (list or None):
+                The files that could not be repaired.
+        '''
+
+        if problems is None:
+            message = 'The game files could not be verified.'
+        elif not problems:
+            message = 'Every game file is intact.'
+        elif not failed:
+            message = f'{len(problems)} broken game file(s) were repaired.'
+        else:
+            message = f'{len(failed)} game file(s) could not be repaired.'
+        rumps.notification(
+            title='Game files verified',
+            subtitle=None,
+            message=message,
+        )
+
+    def _start_prewarm(self):
+        '''Prewarms the game's files on a background thread.
+
+        Nothing happens if the files are already being prewarmed.
+        '''
+
+        if self._prewarm_thread and self._prewarm_thread.is_alive():
+            return
+        self._prewarm_thread = threading.Thread(
+            target=self._prewarm,
+            daemon=True,
+        )
+        self._prewarm_thread.start()
+
+    def _prewarm(self):
+        '''Loads the game's large files into the page cache.
+
+        At most half of the free memory is used, so that prewarming 
+        never pushes the clients themselves out of memory.
+        '''
+
+        start = time.monotonic()
+        free_memory = admission.get_free_memory()
+        budget = free_memory * 2**20 // 2 if free_memory else None
+        warmed = install.prewarm(self._manifest, budget=budget)
+        events.info(
+            'install.prewarm',
+            bytes=warmed,
+            seconds=round(time.monotonic() - start, 3),
+        )
+
+    @events.dump_on_error
+    def _admit_next(self, sender):
+        '''Launches the next queued account if the system has capacity.
+
+        Args:
+            sender (rumps.Timer):
+                Automatically sent when the timer fires.
+        '''
+
+        # Skip any accounts that were removed while they were queued
+        accounts = self.accounts
+        while self._launch_queue and self._launch_queue[0] not in accounts:
+            self._report_launch(self._launch_queue.popleft(), 'unknown', True)
+        # Stop checking once every queued account has been launched
+        if not self._launch_queue:
+            self._admission_timer.stop()
+            return
+        # Wait for the game's files to be verified before launching
+        if self._integrity_thread and self._integrity_thread.is_alive():
+            return
+        # Wait for the Toontown Rewritten API to recover before launching
+        if not breaker.TTR_API.available:
+            return
+        # Launch the next account if the admission controller allows it
+        if self._admission.admit():
+            name = self._launch_queue.popleft()
+            self._report_launch(name, 'launching', False)
+            try:
+                success = self.launch(name)()
+            except Exception:
+                # The launch recorded the crash, so only report the failure
+                success = False
+            state = 'launched' if success else 'failed'
+            self._report_launch(name, state, True)
+        elif events.logger.isEnabledFor(events.DEBUG):
+            events.debug(
+                'launch.deferred',
+                queued=len(self._launch_queue),
+                booting=self._admission.booting,
+            )
+
+    def _report_launch(self, name, state, final):
+        '''Reports the progress of a queued account to its listeners.
+
+        Args:
+            name (str):
+                The name of the account.
+            state (str):
+                The account's new state.
+            final (bool):
+                Whether or not this is the account's last state, after 
+                which its listeners are forgotten.
+        '''
+
+        if final:
+            listeners = self._launch_listeners.pop(name, [])
+        else:
+            listeners = self._launch_listeners.get(name, [])
+        for listener in listeners:
+            listener(name, state, final)
 
     def _disable_if_no_accounts(self, item, callback):
         '''Disables the specified item if no accounts are configured.
@@ -367,14 +1463,18 @@ class MenuBar(rumps.App):
     def _update_login_option(self):
         '''Toggles the "Run at Login" preference.
 
-        Looks at the user's system preferences to see if the 
-        application is currently configured to run at login. If it is, 
-        it checks the "Run at Login" menu item. If it isn't, it will 
-        uncheck it.
+        Asks the run at login backend whether the application is 
+        currently configured to run at login. If it is, it checks the 
+        "Run at Login" menu item. If it isn't, it will uncheck it. Until 
+        the backend has been asked once, the state from the snapshot is 
+        used instead.
         '''
 
         menu_item = self._login_option
-        value = login.run_at_login_is_enabled()
+        if self._login_state is not None:
+            value = self._login_state
+        else:
+            value = self._login.is_enabled()
         self._update_option(menu_item, value)
 
     def _get_resource(self, filename):
@@ -404,33 +1504,101 @@ class MenuBar(rumps.App):
         # Return the filepath
         return path
 
+    @events.dump_on_error
     def _get_invasions(self, sender):
         '''Notifies the user of new invasions.
 
-        Communicates with the Toontown Rewritten API to get information 
-        about current invasions, then determines which invasions are 
-        new. If there are new invasions, the user will be notified via 
-        notification.
+        Communicates with the Toontown Rewritten API (or whatever 
+        source the tracker was replaced with) to get information about 
+        current invasions, then processes them.
 
         Args:
             sender (rumps.MenuItem):
                 Automatically sent when a menu item is invoked.
         '''
 
+        # Recorded polls are fed in by the replay instead
+        if self._replay is not None:
+            return
+        try:
+            details = self._tracker.get_details()
+        except breaker.CircuitOpenError:
+            return
+        except (requests.RequestException, ValueError) as error:
+            events.warning('invasions.error', error=str(error))
+            return
+        if events.logger.isEnabledFor(events.DEBUG):
+            events.debug('invasions.poll', invasions=len(details))
+        self._process_invasions(details)
+
+    def _process_invasions(self, details, now=None):
+        '''Notifies the user of new invasions.
+
+        Determines which invasions are new. If there are new invasions, 
+        the user will be notified via notification. The "Current 
+        Invasions" submenu is also updated.
+
+        Args:
+            details (dict):
+                A dictionary of invaded districts and tuples of their 
+                invading cog and progress.
+            now (float):
+                The time of the poll, such as its recorded time when 
+                replaying a recording. Defaults to None, in which case 
+                the current time is used.
+        '''
+
         # Get the previous iteration's and the current invasion information
+        now = time.time() if now is None else now
         previous = self._invasions
-        current = self._tracker.get_invasions()
-
-        # Determine what invasions changed since the last check
-        difference = set(current.items()) - set(previous.items())
-        # Send a notification for each different invasion
-        for invasion in difference:
-            district, cog = invasion
+        current = invasions.get_cogs(details)
+        ends = self._estimator.update(details, now=now)
+
+        # Send a notification for each invasion that changed since last check
+        for district, cog in invasions.diff_invasions(previous, current):
+            events.info('invasions.new', district=district, cog=cog)
+            message = f'{cog}s have invaded {district}!'
+            if ends.get(district):
+                end = estimator.format_time(ends[district])
+                message = f'{message} It should end around {end}.'
             rumps.notification(
                 title='A cog invasion has begun!',
                 subtitle=None,
-                message=f'{cog}s have invaded {district}!',
+                message=message,
             )
-        
-        # Store the current invasions for the next iteration
+
+        # Alert once for each invasion that is predicted to end soon
+        self._ending_alerted &= set(current.items())
+        for district, end in ends.items():
+            invasion = (district, current[district])
+            if (
+                not self._ending_soon
+                or not end
+                or invasion in self._ending_alerted
+                or end - now > self._ending_soon * 60
+            ):
+                continue
+            self._ending_alerted.add(invasion)
+            rumps.notification(
+                title='A cog invasion is ending soon!',
+                subtitle=None,
+                message=(
+                    f'The {current[district]} invasion of {district} '
+                    f'should end around {estimator.format_time(end)}.'
+                ),
+            )
+
+        # Show the progress and predicted end of each invasion in the menu
+        self._invasions_menu.update(details, ends)
+        self._invasion_details = details
+        self._invasion_ends = ends
+
+        # Store the current invasions for the next iteration and restarts
+        if self._invasion_state and (
+            current != previous
+            or time.time() - self._invasion_saved > self._warm_start_age / 2
+        ):
+            invasions.save_state(self._invasion_state, current)
+            self._save_snapshot(force=True)
+            self._invasion_saved = time.time()
         self._invasions = current
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.breaker module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The breaker module for the MultiTooner application. Contains a circuit
+breaker that stops calling the Toontown Rewritten API while it is down,
+rather than waiting for every request to time out.
+'''
+
+import random
+import threading
+import time
+
+
+# The possible states of a circuit breaker
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(Exception):
+    '''Raised instead of making a call while the circuit is open.
+
+    Args:
+        retry_after (float):
+            The number of seconds until a call will be tried again.
+    '''
+
+    def __init__(self, retry_after):
+        '''Please see help(CircuitOpenError) for more info.'''
+
+        super().__init__(f'Unavailable for another {retry_after:.0f} s.')
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    '''Fails fast while a service keeps failing.
+
+    While closed, calls go through and consecutive failures are counted.
+    Once the threshold is reached, the circuit opens and every call
+    fails immediately with a CircuitOpenError. After a delay, the
+    circuit is half-open and a single trial call is let through: if it
+    succeeds, the circuit closes again, and if it fails, the circuit
+    reopens for twice as long, up to the maximum delay. Each delay is
+    randomly jittered, so that clients don't all retry in lockstep.
+
+    A circuit breaker may be shared by many threads.
+
+    Args:
+        threshold (int):
+            The number of consecutive failures that open the circuit.
+            Defaults to 3.
+        base_delay (int or float):
+            The number of seconds the circuit first stays open for.
+            Defaults to 5.
+        max_delay (int or float):
+            The maximum number of seconds the circuit stays open for.
+            Defaults to 300.
+        jitter (float):
+            The fraction that each delay is randomly varied by. Defaults
+            to 0.2.
+        failures (tuple):
+            The exceptions that count as failures. Others are raised
+            without being counted. Defaults to (OSError, ValueError),
+            which includes the exceptions of the requests library and
+            invalid JSON responses.
+        on_change (function):
+            A function to call with the new state whenever the state
+            changes, from whichever thread changed it. Defaults to None.
+    '''
+
+    def __init__(self, threshold=3, base_delay=5, max_delay=300, jitter=0.2,
+                 failures=(OSError, ValueError), on_change=None):
+        '''Please see help(CircuitBreaker) for more info.'''
+
+        # Store parameters
+        self.threshold = threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.failures = failures
+        self.on_change = on_change
+
+        # Keep track of the failures and when to try again
+        self._state = CLOSED
+        self._failures = 0
+        self._trips = 0
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        '''Returns the state of the circuit.'''
+
+        with self._lock:
+            if self._state == OPEN and time.monotonic() >= self._retry_at:
+                return HALF_OPEN
+            return self._state
+
+    @property
+    def available(self):
+        '''Returns whether or not a call would currently be let through.'''
+
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            return self._state == OPEN and time.monotonic() >= self._retry_at
+
+    @property
+    def retry_after(self):
+        '''Returns the number of seconds until a call is tried again.'''
+
+        with self._lock:
+            if self._state == CLOSED:
+                return 0
+            return max(self._retry_at - time.monotonic(), 0)
+
+    def call(self, function, *args, **kwargs):
+        '''Calls a function through the circuit breaker.
+
+        Returns the result of the function, or raises a CircuitOpenError
+        without calling it if the circuit is open.
+
+        Args:
+            function (function):
+                The function to call.
+            *args, **kwargs:
+                The arguments to call the function with.
+        '''
+
+        self._before_call()
+        try:
+            result = function(*args, **kwargs)
+        except self.failures:
+            self._record_failure()
+            raise
+        except BaseException:
+            self._release_trial()
+            raise
+        self._record_success()
+        return result
+
+    def reset(self):
+        '''Closes the circuit and forgets every failure.'''
+
+        self._set_state(CLOSED, failures=0, trips=0)
+
+    def _before_call(self):
+        '''Raises a CircuitOpenError unless the call may go through.'''
+
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            now = time.monotonic()
+            if self._state != OPEN or now < self._retry_at:
+                raise CircuitOpenError(max(self._retry_at - now, 0))
+            # Let a single trial call through
+            self._state = HALF_OPEN
+        if self.on_change is not None:
+            self.on_change(HALF_OPEN)
+
+    def _record_success(self):
+        '''Closes the circuit after a successful call.'''
+
+        self._set_state(CLOSED, failures=0, trips=0)
+
+    def _record_failure(self):
+        '''Counts a failed call, opening the circuit if necessary.'''
+
+        with self._lock:
+            # A straggler that failed after the circuit opened changes nothing
+            if self._state == OPEN:
+                return
+            self._failures += 1
+            if self._state == CLOSED and self._failures < self.threshold:
+                return
+            trips = self._trips + 1
+        self._set_state(OPEN, trips=trips)
+
+    def _release_trial(self):
+        '''Lets another trial call through after one was interrupted.'''
+
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = OPEN
+
+    def _set_state(self, state, failures=None, trips=None):
+        '''Changes the state and notifies the listener if it changed.
+
+        Args:
+            state (str):
+                The new state.
+            failures (int):
+                The new number of consecutive failures. Defaults to
+                None, in which case it is unchanged.
+            trips (int):
+                The new number of times the circuit opened in a row.
+                Defaults to None, in which case it is unchanged.
+        '''
+
+        with self._lock:
+            if failures is not None:
+                self._failures = failures
+            if trips is not None:
+                self._trips = trips
+            if state == OPEN:
+                # Back off exponentially, with jitter
+                delay = min(
+                    self.base_delay * 2 ** (self._trips - 1),
+                    self.max_delay,
+                )
+                delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+                self._retry_at = time.monotonic() + delay
+            changed = state != self._state
+            self._state = state
+        if changed and self.on_change is not None:
+            self.on_change(state)
+
+
+# The circuit breaker shared by every call to the Toontown Rewritten API
+TTR_API = CircuitBreaker()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.bulk module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The bulk module for the MultiTooner application. Contains functions for
+importing and exporting many accounts at once from CSV or JSON files.
+
+CSV files must have a header row with "name", "username" and "password"
+columns. JSON files must contain a list of objects with the same keys.
+'''
+
+import csv
+import json
+import os
+
+
+# The fields that describe each account, in the order they are written
+FIELDS = ('name', 'username', 'password')
+
+
+def read_accounts(path):
+    '''Reads accounts from a CSV or JSON file.
+
+    Returns a list of (name, username, password) tuples. Whitespace
+    around each field is removed, but no other validation is done (see
+    help(validate_accounts) for that). A file that can't be parsed
+    raises a ValueError.
+
+    Args:
+        path (str):
+            The path to a file with a .csv or .json extension.
+    '''
+
+    # Read the records from the file according to its format, ignoring the
+    # byte order mark that spreadsheet applications write
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        if _format(path) == 'json':
+            records = json.load(file)
+            if not isinstance(records, list):
+                raise ValueError('The file must contain a list of accounts.')
+        else:
+            records = []
+            try:
+                for record in csv.DictReader(file):
+                    records.append(record)
+            except csv.Error as error:
+                number = len(records) + 1
+                raise ValueError(
+                    f'Account {number} could not be read: {error}.'
+                ) from error
+
+    # Convert each record to a tuple of its fields
+    accounts = []
+    for number, record in enumerate(records, start=1):
+        if not isinstance(record, dict):
+            raise ValueError(f'Account {number} is not a set of fields.')
+        accounts.append(tuple(
+            str(record.get(field) or '').strip() for field in FIELDS
+        ))
+    return accounts
+
+
+def validate_accounts(accounts, existing):
+    '''Checks a whole batch of accounts before any of them are added.
+
+    Raises a ValueError listing every problem in the batch, so that
+    either all of the accounts can be added or none of them are.
+
+    Args:
+        accounts (list):
+            A list of (name, username, password) tuples.
+        existing (iterable):
+            The names of the accounts that are already configured.
+    '''
+
+    # Keep a set of the names seen so far to find duplicates quickly
+    seen = set(existing)
+    problems = []
+    for number, (name, username, password) in enumerate(accounts, start=1):
+        if not all([name, username, password]):
+            problems.append(f'Account {number} is missing a field.')
+        elif name == 'DEFAULT':
+            problems.append(f'Account {number} cannot be named DEFAULT.')
+        elif name in seen:
+            problems.append(f'Account {number} ({name}) already exists.')
+        seen.add(name)
+
+    if problems:
+        raise ValueError(' '.join(problems))
+
+
+def write_accounts(path, accounts):
+    '''Writes accounts to a CSV or JSON file.
+
+    The file contains passwords, so only the current user can read it.
+
+    Args:
+        path (str):
+            The path to a file with a .csv or .json extension.
+        accounts (list):
+            A list of (name, username, password) tuples.
+    '''
+
+    records = [dict(zip(FIELDS, account)) for account in accounts]
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    os.fchmod(descriptor, 0o600)
+    with os.fdopen(descriptor, 'w', newline='', encoding='utf-8') as file:
+        if _format(path) == 'json':
+            json.dump(records, file, indent=4)
+        else:
+            writer = csv.DictWriter(file, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+
+
+def _format(path):
+    '''Returns the format of the file based on its extension.
+
+    Args:
+        path (str):
+            The path to the file.
+    '''
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in ('.csv', '.json'):
+        raise ValueError('The file must be a .csv or .json file.')
+    return extension[1:]
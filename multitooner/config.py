@@ -8,10 +8,49 @@ The configuration module for the MultiTooner application. Manages the
 application's configuration file.
 '''
 
-import configparser
-import os
-
-import rumps
+import collections
+
+import events
+import storage
+
+
+# The filename of the configuration file in the Application Support folder
+FILENAME = 'config.db'
+
+
+# The differences found when the configuration file is reloaded
+Changes = collections.namedtuple('Changes', ['added', 'removed', 'settings'])
+
+
+# The default value, type and (optionally) check of each setting
+DEFAULTS = {
+    'invasions': {'value': 0, 'type': int},
+    'interval': {'value': 60, 'type': int, 'valid': lambda v: v > 0},
+    'login': {
+        'value': 'launchagent',
+        'type': str,
+        'valid': lambda v: v in ('launchagent', 'legacy', 'memory'),
+    },
+    'max_booting': {'value': 2, 'type': int, 'valid': lambda v: v > 0},
+    'max_load': {'value': 0, 'type': float, 'valid': lambda v: v >= 0},
+    'min_free_memory': {'value': 512, 'type': int, 'valid': lambda v: v >= 0},
+    'boot_time': {'value': 30, 'type': int, 'valid': lambda v: v >= 0},
+    'diagnostics': {'value': 0, 'type': int},
+    'stall_threshold': {'value': 500, 'type': int, 'valid': lambda v: v > 0},
+    'warm_start_age': {'value': 900, 'type': int, 'valid': lambda v: v >= 0},
+    'verify_workers': {'value': 4, 'type': int, 'valid': lambda v: v > 0},
+    'verify_ttl': {'value': 3600, 'type': int, 'valid': lambda v: v >= 0},
+    'log_level': {
+        'value': 'INFO',
+        'type': str,
+        'valid': lambda v: v.upper() in ('DEBUG', 'INFO', 'WARNING', 'ERROR'),
+    },
+    'prewarm': {'value': 1, 'type': int},
+    'verify_install': {'value': 0, 'type': int},
+    'control': {'value': 0, 'type': int},
+    'ending_soon': {'value': 0, 'type': int, 'valid': lambda v: v >= 0},
+    'login_migrated': {'value': 0, 'type': int},
+}
 
 
 def save_config(function):
@@ -22,74 +61,104 @@ def save_config(function):
     return wrapper
 
 
-class Configuration(configparser.ConfigParser):
+class Configuration:
     '''Handles the application's configuration file.
 
-    A subclass of configparser.ConfigParser, with only a few additional 
-    properties and methods that simply aim to make adding accounts from 
-    other modules easier.
+    Provides a few properties and methods that simply aim to make 
+    reading and adding settings and accounts from other modules easier. 
+    The configuration itself is kept by a storage backend, which is 
+    chosen by the extension of the configuration file (see 
+    help(storage.open_storage) for more info).
 
     Args:
         application (multitooner.app.Application object):
-            A reference to the main Application object.
+            A reference to the main Application object, or any object 
+            that resolves filenames to paths in the Application Support 
+            folder (such as support.SupportFolder).
         filename (str):
             The filename of the configuration file (not the full 
             filepath).
 
     Attributes:
         accounts:
-            Returns a list of sections (which is essentially just a 
-            list of account names).
+            Returns a list of account names.
     '''
 
     def __init__(self, application, filename):
         '''Please see help(Configuration) for more info.'''
 
-        # Store parameters and initialize the class
+        # Store parameters
         self._application = application
         self._filename = filename
-        super().__init__(self)
 
         # Build the path to the configuration file
         self._config_path = self._application[self._filename]
-        # Read the configuration file whether it exists or not
-        self.read(self._config_path)
+        # Open the storage backend whether the file exists or not
+        self._storage = storage.open_storage(self._config_path)
+        # Remember the last valid value of each setting
+        self._valid = {}
+        self._invalid = {}
         # Set default options
         self._set_default_values(overwrite=False)
 
     @save_config
-    def _set_default_values(self, section='DEFAULT', overwrite=False):
-        '''
+    def _set_default_values(self, overwrite=False):
+        '''Sets the default value of each setting.
 
+        Args:
+            overwrite (bool):
+                Whether or not to overwrite settings that already have 
+                a value. Defaults to False.
         '''
 
-        # Make a dictionary of default options and values
-        self._default_settings = {
-            'invasions': {'value': 0, 'type': int},
-            'interval': {'value': 60, 'type': int},
-        }
         # Overwrite the option or create it if it doesn't already exist
-        for option, value in self._default_settings.items():
-            if overwrite or not self.has_option(section, option):
-                self.set(section, option, str(value['value']))
+        settings = self._storage.get_settings()
+        for option, value in DEFAULTS.items():
+            if overwrite or option not in settings:
+                self._storage.set_setting(option, str(value['value']))
 
-    def get_setting(self, option, section='DEFAULT'):
-        '''
+    def get_setting(self, option):
+        '''Gets the value of the specified setting.
+
+        If the stored value is invalid (e.g. it was mistyped while 
+        editing the file by hand), the last valid value is used instead, 
+        or the default if there never was one.
 
+        Args:
+            option (str):
+                The name of the setting.
         '''
 
         # Get the value of the specified option and cast it appropriately
-        value = self.get(section, option)
-        return self._default_settings[option]['type'](value)
+        value = self._storage.get_settings().get(option)
+        default = DEFAULTS[option]
+        try:
+            cast = default['type'](value)
+            if not default.get('valid', lambda v: True)(cast):
+                raise ValueError(value)
+        except (TypeError, ValueError):
+            # Only log each invalid value once
+            if self._invalid.get(option) != value:
+                self._invalid[option] = value
+                events.warning('config.invalid', option=option, value=value)
+            return self._valid.get(option, default['value'])
+        self._invalid.pop(option, None)
+        self._valid[option] = cast
+        return cast
 
     @save_config
-    def set_setting(self, option, value, section='DEFAULT'):
-        '''
+    def set_setting(self, option, value):
+        '''Sets the value of the specified setting.
 
+        Args:
+            option (str):
+                The name of the setting.
+            value:
+                The new value of the setting.
         '''
 
         # Set the value of the specified option
-        self.set(section, option, str(value))
+        self._storage.set_setting(option, str(value))
 
     def get_account(self, account):
         '''Get information about the specified account.
@@ -103,53 +172,128 @@ class Configuration(configparser.ConfigParser):
                 is listed in the configuration file.
         '''
 
-        return self[account]['username'], self[account]['password']
+        return self._storage.get_account(account)
 
     @save_config
     def add_account(self, name, username, password):
         '''Add an account to the configuration file.
         
-        Creates a new section in the configuration file for an account 
+        Creates a new record in the configuration file for an account 
         and populates it with its corresponding username and password.
 
         Args:
             name (str):
                 The name that the user wishes to call the account by. 
-                Will be used as the name of the new section in the 
-                configuration file.
             username (str):
                 The username of the new account.
             password (str):
                 The password the corresponds to the given username.
         '''
 
-        self.add_section(name)
-        self.set(name, 'username', username)
-        self.set(name, 'password', password)
+        self._storage.put_account(name, username, password)
+
+    @save_config
+    def add_accounts(self, accounts):
+        '''Add several accounts to the configuration file at once.
+
+        Every account is added before the configuration file is saved, 
+        so the whole batch is written in a single save.
+
+        Args:
+            accounts (list):
+                A list of (name, username, password) tuples.
+        '''
+
+        for name, username, password in accounts:
+            self._storage.put_account(name, username, password)
 
     @save_config
     def remove_account(self, name):
         '''Removes an account from the configuration file.
         
-        Removes the section in the configuration file that corresponds to 
+        Removes the record in the configuration file that corresponds to 
         the account that the user would like to remove.
 
         Args:
             name (str):
-                The name of the account/section of the configuration 
-                file that the user wishes to remove.
+                The name of the account that the user wishes to remove.
         '''
 
-        self.remove_section(name)
+        self._storage.delete_account(name)
 
     def save(self):
         '''Saves the configuration file.'''
 
-        with open(self._config_path, 'w') as config:
-            self.write(config)
+        self._storage.save()
+        events.info('config.save', path=self._config_path)
+
+    def reload(self):
+        '''Reloads the configuration file after it was changed elsewhere.
+
+        Returns a Changes tuple of the names of the accounts that were 
+        added and removed, and a dictionary of the settings whose 
+        values changed along with their new values.
+        '''
+
+        # Note the accounts and settings before reloading
+        accounts = self.accounts
+        settings = self.settings
+
+        # Reload the configuration and restore any missing default options
+        self._storage.reload()
+        self._set_default_values(overwrite=False)
+
+        # Determine what changed
+        return self.compare(accounts, settings)
+
+    def compare(self, accounts, settings):
+        '''Returns what differs from the given accounts and settings.
+
+        Returns a Changes tuple of the names of the accounts that were 
+        added and removed, and a dictionary of the settings whose 
+        values differ along with their current values.
+
+        Args:
+            accounts (list):
+                The account names to compare against.
+            settings (dict):
+                The settings and values to compare against.
+        '''
+
+        current = self.accounts
+        before, after = set(accounts), set(current)
+        return Changes(
+            added=[name for name in current if name not in before],
+            removed=[name for name in accounts if name not in after],
+            settings={
+                option: value
+                for option, value in self.settings.items()
+                if settings.get(option) != value
+            },
+        )
+
+    @property
+    def settings(self):
+        '''Returns a dictionary of every setting and its value.'''
+
+        return {option: self.get_setting(option) for option in DEFAULTS}
+
+    def changed_elsewhere(self):
+        '''Returns whether something else changed the configuration file.
+
+        The application's own saves are never reported.
+        '''
+
+        return self._storage.changed_elsewhere()
+
+    @property
+    def path(self):
+        '''Returns the full path to the configuration file.'''
+
+        return self._config_path
 
     @property
     def accounts(self):
-        '''Returns a list of accounts/sections of the configuration.'''
+        '''Returns a list of configured account names.'''
 
-        return self.sections()
+        return self._storage.get_accounts()
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.control module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The control module for the MultiTooner application. Contains a local
+server that lets scripts drive the running application.
+
+The server listens on a Unix socket that only the current user can
+access. Each request is a single line of JSON with the control token
+and a batch of commands, e.g.:
+    {"token": "...", "commands": [
+        {"command": "launch", "accounts": ["main", "alt"]},
+        {"command": "status"},
+        {"command": "invasions"}
+    ]}
+Responses are streamed back as lines of JSON while the commands run,
+followed by {"done": true} once every command has finished (or along
+with the error if the request itself was rejected). A command that
+fails or stops responding gets an {"error": "..."} response and the
+rest of the batch still runs. A connection may send any number of
+requests.
+'''
+
+import hmac
+import json
+import os
+import queue
+import secrets
+import socket
+import threading
+
+
+# The names of the socket and token in the Application Support folder
+SOCKET_FILENAME = 'control.sock'
+TOKEN_FILENAME = 'control.token'
+
+# Put on a command's queue once it has finished
+FINISHED = object()
+
+# The number of seconds to wait for each of a command's responses
+TIMEOUT = 600
+
+
+def get_token(path):
+    '''Returns the control token, creating it if it doesn't exist.
+
+    The token is stored in a file that only the current user can read.
+
+    Args:
+        path (str):
+            The full path to the token file.
+    '''
+
+    try:
+        with open(path) as file:
+            token = file.read().strip()
+        if token:
+            return token
+    except FileNotFoundError:
+        pass
+    token = secrets.token_urlsafe(32)
+    descriptor = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'w') as file:
+        file.write(token)
+    return token
+
+
+def send(path, token, commands, timeout=None):
+    '''Sends a batch of commands to the running application.
+
+    Yields each response as it arrives, until every command finished.
+    Raises a ValueError if the request was rejected.
+
+    Args:
+        path (str):
+            The full path to the control socket.
+        token (str):
+            The control token.
+        commands (list):
+            The commands to run, e.g. [{"command": "status"}].
+        timeout (int or float):
+            The number of seconds to wait for each response. Defaults to
+            None, in which case there is no limit.
+    '''
+
+    request = {'token': token, 'commands': commands}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path)
+        client.sendall((json.dumps(request) + '\n').encode())
+        for line in client.makefile('rb'):
+            response = json.loads(line)
+            if 'error' in response and response.get('done'):
+                raise ValueError(response['error'])
+            if response.get('done'):
+                return
+            yield response
+
+
+class ControlServer:
+    '''Accepts batches of commands from local scripts.
+
+    Each command is passed to the dispatcher along with a queue. The
+    dispatcher puts the command's responses on the queue as it runs,
+    and FINISHED once it is done; the responses are written back to the
+    client as soon as they are put on the queue. The dispatcher is
+    called from the connection's thread, so it should hand any work
+    that touches the menu off to the main thread.
+
+    Args:
+        path (str):
+            The full path to the socket.
+        token (str):
+            The token that every request must include.
+        dispatcher (function):
+            The function that runs a command, which takes the command
+            (a dictionary) and a queue.Queue for its responses.
+        timeout (int or float):
+            The number of seconds to wait for each of a command's
+            responses before giving up on it. Defaults to TIMEOUT.
+    '''
+
+    def __init__(self, path, token, dispatcher, timeout=TIMEOUT):
+        '''Please see help(ControlServer) for more info.'''
+
+        self.path = path
+        self.timeout = timeout
+        self._token = token
+        self._dispatcher = dispatcher
+        self._server = None
+
+    def start(self):
+        '''Starts listening for requests.'''
+
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self._server.listen()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def stop(self):
+        '''Stops listening for requests.'''
+
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    def _serve(self):
+        '''Accepts connections until stopped.'''
+
+        while self._server is not None:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(
+                target=self._handle,
+                args=(connection,),
+                daemon=True,
+            ).start()
+
+    def _handle(self, connection):
+        '''Runs every request sent over a connection.
+
+        Args:
+            connection (socket.socket):
+                The client's connection.
+        '''
+
+        with connection, connection.makefile('rwb') as stream:
+            for line in stream:
+                try:
+                    request = json.loads(line)
+                    self._run(request, stream)
+                except ValueError as error:
+                    self._write(stream, {'error': str(error), 'done': True})
+                except OSError:
+                    return
+
+    def _run(self, request, stream):
+        '''Runs a single batch of commands, streaming their responses.
+
+        Args:
+            request (dict):
+                The request, with its token and list of commands.
+            stream (file):
+                The connection's stream.
+        '''
+
+        # Reject requests without the right token
+        if not isinstance(request, dict):
+            raise ValueError('the request must be an object')
+        token = str(request.get('token', ''))
+        if not hmac.compare_digest(token.encode(), self._token.encode()):
+            self._write(stream, {'error': 'invalid token', 'done': True})
+            return
+
+        # Reject the whole batch if any command is malformed
+        commands = request.get('commands', [])
+        if not isinstance(commands, list) or not all(
+            isinstance(command, dict) for command in commands
+        ):
+            raise ValueError('the commands must be a list of objects')
+
+        # Run each command in turn, writing its responses as they arrive
+        for command in commands:
+            responses = queue.Queue()
+            try:
+                self._dispatcher(command, responses)
+            except Exception as error:
+                self._write(stream, {'error': str(error)})
+                continue
+            while True:
+                try:
+                    response = responses.get(timeout=self.timeout)
+                except queue.Empty:
+                    self._write(stream, {'error': 'the command timed out'})
+                    break
+                if response is FINISHED:
+                    break
+                self._write(stream, response)
+        self._write(stream, {'done': True})
+
+    def _write(self, stream, response):
+        '''Writes a response to the client immediately.
+
+        Args:
+            stream (file):
+                The connection's stream.
+            response (dict):
+                The response to write.
+        '''
+
+        stream.write((json.dumps(response) + '\n').encode())
+        stream.flush()
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.diagnostics module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The diagnostics module for the MultiTooner application. Contains tools
+for watching the memory footprint of the long-running application.
+'''
+
+import collections
+import ctypes
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+
+def get_rss():
+    '''Returns the resident set size of the process in bytes.
+
+    Returns None if it cannot be determined. This is cheap enough to 
+    call from the main thread, since it never starts a subprocess.
+    '''
+
+    # Read the resident pages directly where /proc is available
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+
+    # Otherwise, ask the Mach kernel on macOS
+    if sys.platform == 'darwin':
+        return _get_mach_rss()
+    return None
+
+
+class _MachTaskBasicInfo(ctypes.Structure):
+    '''The mach_task_basic_info structure filled in by task_info.'''
+
+    _fields_ = [
+        ('virtual_size', ctypes.c_uint64),
+        ('resident_size', ctypes.c_uint64),
+        ('resident_size_max', ctypes.c_uint64),
+        ('user_time', ctypes.c_int32 * 2),
+        ('system_time', ctypes.c_int32 * 2),
+        ('policy', ctypes.c_int32),
+        ('suspend_count', ctypes.c_int32),
+    ]
+
+
+# The flavor of task_info that returns a mach_task_basic_info
+_MACH_TASK_BASIC_INFO = 20
+
+
+def _get_mach_rss():
+    '''Returns the resident set size from task_info, or None.'''
+
+    try:
+        system = ctypes.CDLL('/usr/lib/libSystem.dylib')
+        task = ctypes.c_uint.in_dll(system, 'mach_task_self_').value
+    except (OSError, ValueError):
+        return None
+    info = _MachTaskBasicInfo()
+    count = ctypes.c_uint(ctypes.sizeof(info) // 4)
+    result = system.task_info(
+        ctypes.c_uint(task),
+        ctypes.c_int(_MACH_TASK_BASIC_INFO),
+        ctypes.byref(info),
+        ctypes.byref(count),
+    )
+    if result != 0:
+        return None
+    return info.resident_size
+
+
+def count_objects(predicates):
+    '''Counts the live objects that match each predicate.
+
+    Every object tracked by the garbage collector is visited only once,
+    no matter how many predicates there are.
+
+    Args:
+        predicates (dict):
+            A dictionary of labels and functions that take an object
+            and return whether or not it should be counted.
+    '''
+
+    counts = dict.fromkeys(predicates, 0)
+    for obj in gc.get_objects():
+        for label, predicate in predicates.items():
+            if predicate(obj):
+                counts[label] += 1
+    return counts
+
+
+class MemoryDiagnostics:
+    '''Tracks the memory footprint of the application over time.
+
+    Records the resident set size each time it is sampled, and can
+    trace allocations with tracemalloc to report the top allocators and
+    the differences between snapshots.
+
+    Args:
+        predicates (dict):
+            A dictionary of labels and functions that decide which
+            objects to count (see help(count_objects)). Defaults to
+            None.
+        gauges (dict):
+            A dictionary of labels and functions that return a count
+            directly, such as the length of a collection. Defaults to
+            None.
+        samples (int):
+            The number of resident set size samples to keep. Defaults
+            to 1440.
+        frames (int):
+            The number of frames tracemalloc keeps per allocation.
+            Defaults to 10.
+    '''
+
+    def __init__(self, predicates=None, gauges=None, samples=1440, frames=10):
+        '''Please see help(MemoryDiagnostics) for more info.'''
+
+        # Store parameters
+        self._predicates = predicates or {}
+        self._gauges = gauges or {}
+        self._frames = frames
+
+        # Keep the most recent samples and snapshots
+        self.history = collections.deque(maxlen=samples)
+        self._snapshot = None
+        self._differences = []
+
+    @property
+    def tracing(self):
+        '''Returns whether or not allocations are being traced.'''
+
+        return tracemalloc.is_tracing()
+
+    def sample(self):
+        '''Records the current resident set size.'''
+
+        rss = get_rss()
+        if rss is not None:
+            self.history.append((time.time(), rss))
+
+    def start_tracing(self):
+        '''Starts tracing allocations and takes a baseline snapshot.'''
+
+        if not self.tracing:
+            tracemalloc.start(self._frames)
+        self._snapshot = tracemalloc.take_snapshot()
+        self._differences = []
+
+    def stop_tracing(self):
+        '''Stops tracing allocations and forgets the snapshots.'''
+
+        tracemalloc.stop()
+        self._snapshot = None
+        self._differences = []
+
+    def take_snapshot(self, limit=10):
+        '''Takes a snapshot and compares it to the previous one.
+
+        Returns the allocations that grew the most since the previous
+        snapshot, which is also kept for the report.
+
+        Args:
+            limit (int):
+                The number of differences to keep. Defaults to 10.
+        '''
+
+        if not self.tracing:
+            self.start_tracing()
+            return []
+        snapshot = tracemalloc.take_snapshot()
+        differences = snapshot.compare_to(self._snapshot, 'lineno')
+        self._snapshot = snapshot
+        self._differences = differences[:limit]
+        return self._differences
+
+    def report(self, limit=10):
+        '''Returns a plain text report of the application's footprint.
+
+        Args:
+            limit (int):
+                The number of top allocators to include. Defaults to 10.
+        '''
+
+        lines = ['MultiTooner Memory Diagnostics', time.ctime(), '']
+
+        # Summarize the resident set size over time
+        lines.append('Resident set size:')
+        if self.history:
+            sizes = [rss for _, rss in self.history]
+            first, last = self.history[0], self.history[-1]
+            lines.append(f'  current: {_megabytes(last[1])}')
+            lines.append(f'  minimum: {_megabytes(min(sizes))}')
+            lines.append(f'  maximum: {_megabytes(max(sizes))}')
+            lines.append(
+                f'  change over {(last[0] - first[0]) / 3600:.1f} hours: '
+                f'{_megabytes(last[1] - first[1])}'
+            )
+        else:
+            lines.append('  no samples')
+        lines.append('')
+
+        # Count the objects of interest
+        lines.append('Object counts:')
+        counts = count_objects(self._predicates)
+        counts.update({label: gauge() for label, gauge in self._gauges.items()})
+        for label, count in counts.items():
+            lines.append(f'  {label}: {count}')
+        lines.append('')
+
+        # List the top allocators and the latest differences when tracing
+        if self.tracing:
+            snapshot = tracemalloc.take_snapshot()
+            lines.append('Top allocators:')
+            for statistic in snapshot.statistics('lineno')[:limit]:
+                lines.append(f'  {statistic}')
+            lines.append('')
+            lines.append('Largest changes since the previous snapshot:')
+            for difference in self._differences or []:
+                lines.append(f'  {difference}')
+        else:
+            lines.append('Allocation tracing is off.')
+
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path, limit=10):
+        '''Writes the report to a file.
+
+        Args:
+            path (str):
+                The path to the file to write.
+            limit (int):
+                The number of top allocators to include. Defaults to 10.
+        '''
+
+        with open(path, 'w') as file:
+            file.write(self.report(limit=limit))
+
+
+def _megabytes(size):
+    '''Formats a number of bytes as megabytes.
+
+    Args:
+        size (int):
+            The number of bytes.
+    '''
+
+    return f'{size / 2**20:.1f} MB'
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.estimator module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The estimator module for the MultiTooner application. Predicts when
+each invasion will end from how quickly its cogs are being defeated.
+
+NumPy is used to fit every invasion at once if it is installed.
+Otherwise, the same fit is done in pure Python.
+'''
+
+import collections
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def parse_progress(progress):
+    '''Returns the defeated and total cogs of an invasion, or None.
+
+    Args:
+        progress (str):
+            The progress of the invasion (e.g. "1234/4000").
+    '''
+
+    try:
+        defeated, total = (int(part) for part in progress.split('/'))
+    except (AttributeError, ValueError):
+        return None
+    return defeated, total
+
+
+def format_time(timestamp):
+    '''Returns a short local time of day, such as "3:45 PM".
+
+    Args:
+        timestamp (float):
+            The time, in seconds since the epoch.
+    '''
+
+    return time.strftime('%I:%M %p', time.localtime(timestamp)).lstrip('0')
+
+
+def fit_rates(samples):
+    '''Returns the rate of each series of samples by least squares.
+
+    Args:
+        samples (list):
+            A list of series, each of which is a list of (time, value)
+            tuples with at least two different times.
+    '''
+
+    if numpy is not None:
+        return _fit_rates_batched(samples)
+    rates = []
+    for series in samples:
+        count = len(series)
+        mean_time = sum(t for t, _ in series) / count
+        mean_value = sum(v for _, v in series) / count
+        covariance = sum(
+            (t - mean_time) * (v - mean_value)
+            for t, v in series
+        )
+        variance = sum((t - mean_time) ** 2 for t, _ in series)
+        rates.append(covariance / variance)
+    return rates
+
+
+def _fit_rates_batched(samples):
+    '''Fits every series at once with NumPy (see fit_rates).
+
+    The series are padded into a single masked array, so that the cost
+    of a fit is a fixed number of array operations no matter how many
+    series there are.
+    '''
+
+    width = max(len(series) for series in samples)
+    times = numpy.zeros((len(samples), width))
+    values = numpy.zeros((len(samples), width))
+    mask = numpy.zeros((len(samples), width), dtype=bool)
+    for row, series in enumerate(samples):
+        times[row, :len(series)], values[row, :len(series)] = zip(*series)
+        mask[row, :len(series)] = True
+    return _fit_arrays(times, values, mask).tolist()
+
+
+def _fit_arrays(times, values, mask):
+    '''Returns the rate of each row of samples by least squares.
+
+    Only the masked samples of each row are fitted, in any order. Rows 
+    without two different times have no rate (NaN). The arrays are left 
+    untouched.
+
+    Args:
+        times (numpy.ndarray):
+            The times of the samples, one row per series.
+        values (numpy.ndarray):
+            The values of the samples, one row per series.
+        mask (numpy.ndarray):
+            Whether or not each sample is part of its series.
+    '''
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        counts = mask.sum(axis=1, keepdims=True)
+        times = times - (times * mask).sum(axis=1, keepdims=True) / counts
+        values = values - (values * mask).sum(axis=1, keepdims=True) / counts
+        covariance = (mask * times * values).sum(axis=1)
+        variance = (mask * times * times).sum(axis=1)
+        return covariance / variance
+
+
+class InvasionEstimator:
+    '''Predicts when each current invasion will end.
+
+    A short series of the progress of each invasion is kept, and the
+    rate at which its cogs are being defeated is fitted with a linear
+    least squares regression. The series is restarted whenever a new
+    invasion begins in the district.
+
+    With NumPy, each district also has a row in a pair of arrays that
+    are kept between polls and used as ring buffers, so each poll only
+    writes its new samples in place before every invasion is fitted.
+
+    Args:
+        window (int):
+            The number of recent polls to fit each invasion to. Defaults
+            to 10.
+        min_samples (int):
+            The number of polls needed before an invasion's end is
+            predicted. Defaults to 3.
+    '''
+
+    def __init__(self, window=10, min_samples=3):
+        '''Please see help(InvasionEstimator) for more info.'''
+
+        self.window = window
+        self.min_samples = min_samples
+        self._series = {}
+
+        # Every district's ring buffer, and the rows no district is using
+        if numpy is not None:
+            self._rows = {}
+            self._free = []
+            self._times = numpy.zeros((0, window))
+            self._values = numpy.zeros((0, window))
+            self._counts = numpy.zeros(0, dtype=int)
+
+    def update(self, details, now=None):
+        '''Adds a poll and returns the predicted end of each invasion.
+
+        The keys of the returned dictionary are the invaded districts,
+        and the values are the predicted times that their invasions end
+        in seconds since the epoch, or None if they can't be predicted
+        yet.
+
+        Args:
+            details (dict):
+                A dictionary of invaded districts and tuples of their
+                invading cog and progress, as returned by
+                InvasionTracker.get_details.
+            now (float):
+                The time of the poll, such as its recorded time when
+                replaying a recording. Defaults to None, in which case
+                the current time is used.
+        '''
+
+        now = time.time() if now is None else now
+
+        # Forget the invasions that ended
+        for district in [d for d in self._series if d not in details]:
+            self._forget(district)
+
+        # Add the progress of each invasion to its series
+        ends = {}
+        for district, (cog, progress) in details.items():
+            ends[district] = None
+            parsed = parse_progress(progress)
+            if parsed is None:
+                self._forget(district)
+                continue
+            defeated, total = parsed
+            key, series = self._series.get(district, (None, None))
+            if (
+                key != (cog, total)
+                or (series and defeated < series[-1][1])
+            ):
+                # A new invasion began, so start a new series
+                series = collections.deque(maxlen=self.window)
+                self._series[district] = ((cog, total), series)
+                if numpy is not None:
+                    self._restart_row(district)
+            if not series or series[-1][0] != now:
+                series.append((now, defeated))
+                if numpy is not None:
+                    row = self._rows[district]
+                    slot = self._counts[row] % self.window
+                    self._times[row, slot] = now
+                    self._values[row, slot] = defeated
+                    self._counts[row] += 1
+
+        # Fit the rate of every invasion with enough progress at once
+        if numpy is not None:
+            return self._predict_batched(ends)
+        fitted = [
+            (district, total, series)
+            for district, ((_, total), series) in self._series.items()
+            if len(series) >= self.min_samples
+        ]
+        if not fitted:
+            return ends
+        rates = fit_rates([
+            [(t - series[0][0], v) for t, v in series]
+            for _, _, series in fitted
+        ])
+        for (district, total, series), rate in zip(fitted, rates):
+            if rate > 0:
+                last_time, defeated = series[-1]
+                ends[district] = last_time + (total - defeated) / rate
+        return ends
+
+    def _predict_batched(self, ends):
+        '''Predicts the end of each invasion from the ring buffers.
+
+        Args:
+            ends (dict):
+                The predicted ends so far, which are filled in and 
+                returned.
+        '''
+
+        lengths = numpy.minimum(self._counts, self.window)
+        if not (lengths >= self.min_samples).any():
+            return ends
+        mask = numpy.arange(self.window) < lengths[:, None]
+        rates = _fit_arrays(self._times, self._values, mask)
+        for district, ((_, total), series) in self._series.items():
+            rate = rates[self._rows[district]]
+            if len(series) >= self.min_samples and rate > 0:
+                last_time, defeated = series[-1]
+                ends[district] = last_time + (total - defeated) / float(rate)
+        return ends
+
+    def _restart_row(self, district):
+        '''Empties the district's ring buffer, giving it one if needed.
+
+        Args:
+            district (str):
+                The name of the district.
+        '''
+
+        if district not in self._rows:
+            if not self._free:
+                # Double the number of rows rather than growing every poll
+                rows = len(self._counts)
+                grown = max(rows, 1)
+                self._free.extend(reversed(range(rows, rows + grown)))
+                empty = numpy.zeros((grown, self.window))
+                self._times = numpy.vstack((self._times, empty))
+                self._values = numpy.vstack((self._values, empty))
+                self._counts = numpy.concatenate(
+                    (self._counts, numpy.zeros(grown, dtype=int))
+                )
+            self._rows[district] = self._free.pop()
+        self._counts[self._rows[district]] = 0
+
+    def _forget(self, district):
+        '''Forgets the series of a district whose invasion ended.
+
+        Args:
+            district (str):
+                The name of the district.
+        '''
+
+        self._series.pop(district, None)
+        if numpy is not None and district in self._rows:
+            row = self._rows.pop(district)
+            self._counts[row] = 0
+            self._free.append(row)
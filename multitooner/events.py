@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.events module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The events module for the MultiTooner application. Contains structured
+event logging for launches, polls, configuration writes and so on.
+
+Every event is kept in an in-memory ring buffer and handed to a
+background thread, which writes it as a line of JSON to a rotating log
+file. Logging an event below the configured level costs a single level
+check, and hot paths can skip even building the event's fields with:
+    if events.logger.isEnabledFor(events.DEBUG):
+        events.debug('poll', invasions=len(invasions))
+'''
+
+import collections
+import faulthandler
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+import traceback
+
+from logging import DEBUG, INFO, WARNING, ERROR
+
+
+# The logger that every event is logged to
+logger = logging.getLogger('multitooner.events')
+logger.propagate = False
+logger.addHandler(logging.NullHandler())
+
+# The handlers installed by configure, and where crashes are written to
+_buffer = None
+_listener = None
+_faults = None
+_crash_directory = None
+
+
+class RingBufferHandler(logging.Handler):
+    '''Keeps the most recent events in memory.
+
+    Args:
+        capacity (int):
+            The maximum number of events to keep. Defaults to 1000.
+    '''
+
+    def __init__(self, capacity=1000):
+        '''Please see help(RingBufferHandler) for more info.'''
+
+        super().__init__()
+        self.records = collections.deque(maxlen=capacity)
+
+    def emit(self, record):
+        '''Adds an event to the buffer, discarding the oldest if full.'''
+
+        self.records.append(record)
+
+    def dump(self, path):
+        '''Writes every buffered event to a file, oldest first.
+
+        Args:
+            path (str):
+                The path to the file to write.
+        '''
+
+        formatter = JSONFormatter()
+        with open(path, 'w') as file:
+            for record in list(self.records):
+                file.write(formatter.format(record) + '\n')
+
+
+class JSONFormatter(logging.Formatter):
+    '''Formats an event as a single line of JSON.'''
+
+    def format(self, record):
+        '''Returns the event's time, level, name and fields as JSON.'''
+
+        event = {
+            'time': round(record.created, 3),
+            'level': record.levelname,
+            'event': record.getMessage(),
+        }
+        event.update(getattr(record, 'fields', {}))
+        return json.dumps(event, default=str)
+
+
+def configure(path, level=INFO, capacity=1000, max_bytes=2**20,
+              backup_count=3):
+    '''Starts writing events to a rotating log file.
+
+    Events are buffered in memory and written from a background thread,
+    so logging never waits on the disk.
+
+    Args:
+        path (str):
+            The full path to the log file.
+        level (int or str):
+            The minimum level of events to keep. Defaults to INFO.
+        capacity (int):
+            The number of recent events to keep in memory. Defaults to
+            1000.
+        max_bytes (int):
+            The size at which the log file is rotated. Defaults to one
+            megabyte.
+        backup_count (int):
+            The number of rotated log files to keep. Defaults to 3.
+    '''
+
+    global _buffer, _listener
+
+    # Stop writing to any previously configured log file
+    shutdown()
+
+    # Keep recent events in memory and queue every event for the file
+    records = queue.Queue()
+    _buffer = RingBufferHandler(capacity)
+    logger.addHandler(_buffer)
+    logger.addHandler(logging.handlers.QueueHandler(records))
+
+    # Write the queued events to the log file from a background thread
+    handler = logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+    )
+    handler.setFormatter(JSONFormatter())
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+
+    set_level(level)
+
+
+def set_level(level):
+    '''Sets the minimum level of events to keep.
+
+    An invalid level is logged and INFO is used instead.
+
+    Args:
+        level (int or str):
+            The level, such as INFO or "DEBUG".
+    '''
+
+    try:
+        logger.setLevel(level.upper() if isinstance(level, str) else level)
+    except (TypeError, ValueError):
+        logger.setLevel(INFO)
+        warning('events.invalid_level', level=level)
+
+
+def shutdown():
+    '''Writes any queued events and stops the background thread.'''
+
+    global _buffer, _listener
+
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    for handler in list(logger.handlers):
+        if not isinstance(handler, logging.NullHandler):
+            logger.removeHandler(handler)
+    _buffer = None
+
+
+def dump(path):
+    '''Writes the events in the ring buffer to a file.
+
+    Returns whether or not anything was written.
+
+    Args:
+        path (str):
+            The path to the file to write.
+    '''
+
+    if _buffer is None:
+        return False
+    _buffer.dump(path)
+    return True
+
+
+def record_crash(kind, value, trace):
+    '''Logs an exception and dumps the ring buffer to a crash log.
+
+    Nothing is dumped until install_crash_handler has been called, and 
+    each exception is only ever recorded once.
+
+    Args:
+        kind (type):
+            The type of the exception.
+        value (BaseException):
+            The exception.
+        trace (traceback):
+            The exception's traceback.
+    '''
+
+    if _crash_directory is None or getattr(value, '_crash_recorded', False):
+        return
+    try:
+        value._crash_recorded = True
+    except AttributeError:
+        pass
+    exception = ''.join(traceback.format_exception(kind, value, trace))
+    error('crash', exception=exception)
+    dump(_crash_directory[time.strftime('crash-%Y%m%d-%H%M%S.log')])
+
+
+def dump_on_error(function):
+    '''Decorator that records a crash if the function raises.
+
+    rumps reports the exceptions raised by menu and timer callbacks 
+    itself, so they never reach sys.excepthook. The exception is 
+    raised again once it has been recorded.
+    '''
+    def wrapper(*args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            record_crash(*sys.exc_info())
+            raise
+    return wrapper
+
+
+def install_crash_handler(directory):
+    '''Dumps the ring buffer to a file if the application crashes.
+
+    Uncaught exceptions dump the buffer to a crash-*.log file in the
+    directory, along with the exception. Hard crashes, which skip
+    Python's exception handling, are written by faulthandler instead.
+
+    Args:
+        directory (support.SupportFolder or multitooner.app.MenuBar):
+            An object that resolves filenames to paths in the directory
+            to write crash logs to.
+    '''
+
+    global _faults, _crash_directory
+
+    _crash_directory = directory
+
+    # Record uncaught exceptions before the usual hook reports them
+    previous_hook = sys.excepthook
+
+    def crash_hook(kind, value, trace):
+        record_crash(kind, value, trace)
+        previous_hook(kind, value, trace)
+
+    sys.excepthook = crash_hook
+
+    # Threads report uncaught exceptions through their own hook
+    if hasattr(threading, 'excepthook'):
+        previous_thread_hook = threading.excepthook
+
+        def thread_crash_hook(arguments):
+            record_crash(
+                arguments.exc_type,
+                arguments.exc_value,
+                arguments.exc_traceback,
+            )
+            previous_thread_hook(arguments)
+
+        threading.excepthook = thread_crash_hook
+
+    # Keep the file open for as long as the process runs
+    if _faults is None:
+        _faults = open(directory['faults.log'], 'a')
+        faulthandler.enable(file=_faults)
+
+
+def debug(event, **fields):
+    '''Logs a debug event.
+
+    Args:
+        event (str):
+            The name of the event.
+        **fields:
+            Any structured information about the event.
+    '''
+
+    if logger.isEnabledFor(DEBUG):
+        logger.debug(event, extra={'fields': fields})
+
+
+def info(event, **fields):
+    '''Logs an informational event. See help(debug) for arguments.'''
+
+    if logger.isEnabledFor(INFO):
+        logger.info(event, extra={'fields': fields})
+
+
+def warning(event, **fields):
+    '''Logs a warning event. See help(debug) for arguments.'''
+
+    if logger.isEnabledFor(WARNING):
+        logger.warning(event, extra={'fields': fields})
+
+
+def error(event, **fields):
+    '''Logs an error event. See help(debug) for arguments.'''
+
+    if logger.isEnabledFor(ERROR):
+        logger.error(event, extra={'fields': fields})
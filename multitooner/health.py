@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.health module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The health module for the MultiTooner application. Contains tools for
+checking that the login information of every account still works,
+without launching the game.
+'''
+
+import concurrent.futures
+import hashlib
+import threading
+import time
+
+import requests
+
+import breaker
+import events
+
+
+# The Toontown Rewritten login API, which is also used by the launcher
+LOGIN_URL = 'https://www.toontownrewritten.com/api/login?format=json'
+
+# The possible results of checking an account
+VALID = 'valid'
+INVALID = 'invalid'
+UNKNOWN = 'unknown'
+
+
+def check_credentials(username, password, timeout=10):
+    '''Checks a username and password against the login API.
+
+    Returns VALID if the API accepted the login information (even if a
+    ToonGuard code or a wait in the queue would still be needed to
+    play), INVALID if it rejected them, or UNKNOWN if the API could not
+    be reached. Requests go through the shared circuit breaker, so
+    UNKNOWN is returned right away while the API is down.
+
+    Args:
+        username (str):
+            The username of the account.
+        password (str):
+            The password of the account.
+        timeout (int or float):
+            The number of seconds to wait for the API. Defaults to 10.
+    '''
+
+    def post():
+        response = requests.post(
+            LOGIN_URL,
+            data={'username': username, 'password': password},
+            headers={'Content-type': 'application/x-www-form-urlencoded'},
+            timeout=timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    try:
+        success = breaker.TTR_API.call(post).get('success', 'false')
+    except (breaker.CircuitOpenError, requests.RequestException, ValueError):
+        return UNKNOWN
+    return VALID if success in ('true', 'partial', 'delayed') else INVALID
+
+
+class CredentialChecker:
+    '''Checks the login information of many accounts concurrently.
+
+    Accounts are checked on a pool of threads, whose size limits how
+    many requests are made to the API at once. Results are cached for a
+    while, keyed by a hash of the login information, so changing an
+    account's password invalidates its cached result.
+
+    Args:
+        max_workers (int):
+            The maximum number of accounts to check at once. Defaults
+            to 4.
+        ttl (int or float):
+            The number of seconds to cache results for. Defaults to
+            3600.
+        check (function):
+            The function that checks a username and password. Defaults
+            to check_credentials.
+    '''
+
+    def __init__(self, max_workers=4, ttl=3600, check=check_credentials):
+        '''Please see help(CredentialChecker) for more info.'''
+
+        # Store parameters
+        self.ttl = ttl
+        self._check = check
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+
+        # Cache the results of each account by name
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get_result(self, name, username, password):
+        '''Returns the cached result of an account, or None if stale.
+
+        Args:
+            name (str):
+                The name of the account.
+            username (str):
+                The username of the account.
+            password (str):
+                The password of the account.
+        '''
+
+        with self._lock:
+            cached = self._cache.get(name)
+        if cached is None:
+            return None
+        fingerprint, result, checked = cached
+        if fingerprint != _fingerprint(username, password):
+            return None
+        if time.monotonic() - checked > self.ttl:
+            return None
+        return result
+
+    def check_all(self, accounts, callback=None):
+        '''Checks every account concurrently.
+
+        Returns a dictionary of account names and futures of their
+        results. The callback, if given, is called from a worker thread
+        as each account finishes.
+
+        Args:
+            accounts (dict):
+                A dictionary of account names and tuples of their
+                username and password.
+            callback (function):
+                A function that takes the name of an account and its
+                result. Defaults to None.
+        '''
+
+        return {
+            name: self._executor.submit(
+                self._check_account,
+                name,
+                username,
+                password,
+                callback,
+            )
+            for name, (username, password) in accounts.items()
+        }
+
+    def _check_account(self, name, username, password, callback):
+        '''Checks a single account and caches its result.'''
+
+        # Always report a result, even if the check itself failed
+        result = UNKNOWN
+        try:
+            result = self._check(username, password)
+            # Only cache conclusive results, so unreachable accounts are retried
+            if result != UNKNOWN:
+                with self._lock:
+                    self._cache[name] = (
+                        _fingerprint(username, password),
+                        result,
+                        time.monotonic(),
+                    )
+        except Exception as error:
+            result = UNKNOWN
+            events.warning('verify.error', account=name, error=str(error))
+        finally:
+            if callback is not None:
+                callback(name, result)
+        return result
+
+
+def _fingerprint(username, password):
+    '''Returns a hash that identifies the login information.
+
+    Args:
+        username (str):
+            The username of the account.
+        password (str):
+            The password of the account.
+    '''
+
+    return hashlib.sha256(f'{username}\0{password}'.encode()).hexdigest()
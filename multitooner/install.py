@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.install module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The install module for the MultiTooner application. Keeps a cached
+manifest of the files in the Toontown Rewritten installation, and uses
+it to prewarm the operating system's page cache before many clients
+are launched at once.
+'''
+
+import json
+import os
+
+
+# The size of the chunks that files are read in when prewarming
+CHUNK_SIZE = 2**20
+
+
+class InstallManifest:
+    '''A cached list of the files in the game's installation.
+
+    Scanning the installation means visiting every file, so the list of
+    files, their sizes and their modification times is cached in a
+    file. The cache is revalidated by only checking the modification
+    time of each directory, which changes whenever a file is added,
+    removed or replaced (as the game's updater does), and the
+    installation is only scanned again if one of them changed.
+
+    Args:
+        directory (str):
+            The directory of the game's installation.
+        cache_path (str):
+            The full path to the file the manifest is cached in.
+    '''
+
+    def __init__(self, directory, cache_path):
+        '''Please see help(InstallManifest) for more info.'''
+
+        self.directory = directory
+        self.cache_path = cache_path
+        self._manifest = None
+
+    @property
+    def files(self):
+        '''Returns a dictionary of relative paths and (size, mtime) tuples.'''
+
+        return {
+            path: tuple(info)
+            for path, info in self.load()['files'].items()
+        }
+
+    def load(self):
+        '''Returns the manifest, scanning the installation only if needed.'''
+
+        # Use the manifest in memory, or else the cached one, if still valid
+        if self._manifest is None:
+            self._manifest = self._read_cache()
+        if self._manifest is not None and self._is_current(self._manifest):
+            return self._manifest
+
+        # Otherwise, scan the installation and cache the result
+        self._manifest = self._scan()
+        self._write_cache(self._manifest)
+        return self._manifest
+
+    def _is_current(self, manifest):
+        '''Returns whether or not no directory changed since the scan.
+
+        Args:
+            manifest (dict):
+                The manifest to check.
+        '''
+
+        for path, mtime in manifest['directories'].items():
+            try:
+                stat = os.stat(os.path.join(self.directory, path))
+            except OSError:
+                return False
+            if stat.st_mtime_ns != mtime:
+                return False
+        return True
+
+    def _scan(self):
+        '''Walks the installation and returns a new manifest.'''
+
+        directories = {}
+        files = {}
+        pending = ['']
+        while pending:
+            relative = pending.pop()
+            path = os.path.join(self.directory, relative)
+            try:
+                directories[relative] = os.stat(path).st_mtime_ns
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+            for entry in entries:
+                name = os.path.join(relative, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(name)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files[name] = (stat.st_size, stat.st_mtime_ns)
+        return {'directories': directories, 'files': files}
+
+    def _read_cache(self):
+        '''Returns the cached manifest, or None if it can't be read.'''
+
+        try:
+            with open(self.cache_path) as cache:
+                manifest = json.load(cache)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('directory') != self.directory:
+            return None
+        return manifest
+
+    def _write_cache(self, manifest):
+        '''Caches the manifest in a file.
+
+        Args:
+            manifest (dict):
+                The manifest to cache.
+        '''
+
+        temporary = f'{self.cache_path}.tmp'
+        with open(temporary, 'w') as cache:
+            json.dump(dict(manifest, directory=self.directory), cache)
+        os.replace(temporary, self.cache_path)
+
+
+def prewarm(manifest, min_size=CHUNK_SIZE, budget=None):
+    '''Loads the game's large files into the operating system's page cache.
+
+    When many clients start at the same time, each of them reads the
+    same resource files. Reading them ahead of time means the clients
+    find them in memory rather than all faulting them in from disk.
+
+    Where the operating system supports it, the kernel is simply asked
+    to read the file ahead with posix_fadvise. Otherwise (such as on
+    macOS), the file is read sequentially into a reused buffer.
+
+    Returns the number of bytes prewarmed.
+
+    Args:
+        manifest (InstallManifest):
+            The manifest of the game's installation.
+        min_size (int):
+            The size of the smallest file to prewarm, in bytes. Defaults
+            to one megabyte.
+        budget (int):
+            The maximum number of bytes to prewarm. Defaults to None,
+            in which case there is no limit.
+    '''
+
+    # Prewarm the largest files first, since they take longest to fault in
+    files = sorted(
+        (
+            (size, path)
+            for path, (size, _) in manifest.files.items()
+            if size >= min_size
+        ),
+        reverse=True,
+    )
+
+    warmed = 0
+    buffer = bytearray(CHUNK_SIZE)
+    for size, path in files:
+        if budget is not None and warmed + size > budget:
+            continue
+        try:
+            with open(os.path.join(manifest.directory, path), 'rb') as file:
+                if hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(
+                        file.fileno(),
+                        0,
+                        0,
+                        os.POSIX_FADV_WILLNEED,
+                    )
+                else:
+                    while file.readinto(buffer):
+                        pass
+        except OSError:
+            continue
+        warmed += size
+    return warmed
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.instance module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The instance module for the MultiTooner application. Makes sure that
+only one instance of the application runs at a time, and lets other
+launches of the application hand their intent off to it.
+
+This module deliberately only uses the standard library, so that a
+second launch can check for a running instance and exit without
+loading the rest of the application.
+'''
+
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+
+
+# The names of the lock and socket in the Application Support folder
+LOCK_FILENAME = 'multitooner.lock'
+SOCKET_FILENAME = 'multitooner.sock'
+
+# The commands that another launch may forward
+COMMANDS = ('activate', 'launch')
+
+
+def validate_intent(intent):
+    '''Returns a clean copy of an intent, or raises a ValueError.
+
+    Only the known fields are kept, so an intent can never pass anything 
+    else on to the running instance.
+
+    Args:
+        intent (dict):
+            The intent, whose "command" is either "activate" or 
+            "launch", along with an optional list of "accounts".
+    '''
+
+    if not isinstance(intent, dict):
+        raise ValueError('The intent must be a JSON object.')
+    command = intent.get('command')
+    if command not in COMMANDS:
+        raise ValueError(f'Unknown command: {command!r}')
+    accounts = intent.get('accounts') or []
+    if not isinstance(accounts, list) or not all(
+        isinstance(account, str) for account in accounts
+    ):
+        raise ValueError('The accounts must be a list of names.')
+    return {'command': command, 'accounts': accounts}
+
+
+class InstanceLock:
+    '''An exclusive lock held by the running instance.
+
+    The lock is an flock on a file, so the operating system releases it
+    as soon as the process holding it exits, even if it crashes.
+
+    Args:
+        path (str):
+            The full path to the lock file.
+    '''
+
+    def __init__(self, path):
+        '''Please see help(InstanceLock) for more info.'''
+
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        '''Tries to acquire the lock without waiting.
+
+        Returns True if the lock was acquired, or False if another
+        instance is holding it.
+        '''
+
+        self._file = open(self.path, 'a')
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+        return True
+
+    def release(self):
+        '''Releases the lock.'''
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def forward(path, intent, timeout=2):
+    '''Sends an intent to the running instance.
+
+    The running instance may still be starting up, in which case its
+    socket is retried until the timeout. Returns whether or not the
+    intent was delivered.
+
+    Args:
+        path (str):
+            The full path to the running instance's socket.
+        intent (dict):
+            The intent to send, such as {"command": "activate"}.
+        timeout (int or float):
+            The number of seconds to keep trying for. Defaults to 2.
+    '''
+
+    message = (json.dumps(intent) + '\n').encode()
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.settimeout(timeout)
+                client.connect(path)
+                client.sendall(message)
+                return client.makefile('rb').readline().strip() == b'ok'
+        except OSError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+
+
+class InstanceServer:
+    '''Receives intents forwarded by other launches of the application.
+
+    Each connection sends a single line of JSON, which is validated
+    before it is passed on (see help(validate_intent)). The handler is
+    called from the server's own thread, so it should hand any work
+    that touches the menu off to the main thread.
+
+    Args:
+        path (str):
+            The full path to the socket.
+        handler (function):
+            The function to call with each valid intent.
+    '''
+
+    def __init__(self, path, handler):
+        '''Please see help(InstanceServer) for more info.'''
+
+        self.path = path
+        self._handler = handler
+        self._server = None
+
+    def start(self):
+        '''Starts listening for intents.'''
+
+        # Any existing socket is stale, since only the lock holder serves
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self._server.listen()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def stop(self):
+        '''Stops listening for intents.'''
+
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    def _serve(self):
+        '''Accepts connections until stopped.'''
+
+        while self._server is not None:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            with connection:
+                try:
+                    connection.settimeout(2)
+                    line = connection.makefile('rb').readline()
+                    self._handler(validate_intent(json.loads(line)))
+                    connection.sendall(b'ok\n')
+                except (OSError, ValueError):
+                    continue
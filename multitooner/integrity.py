@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.integrity module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The integrity module for the MultiTooner application. Verifies the
+files of the Toontown Rewritten installation against the game's patch
+manifest, and repairs the files that are missing or corrupted.
+'''
+
+import bz2
+import concurrent.futures
+import hashlib
+import json
+import os
+
+import requests
+
+import events
+
+
+# The patch manifest and the location of the files it refers to
+MANIFEST_URL = 'https://cdn.toontownrewritten.com/content/patchmanifest.txt'
+PATCHES_URL = 'https://download.toontownrewritten.com/patches/'
+
+# The size of the chunks that files are read and downloaded in
+CHUNK_SIZE = 2**20
+
+# The possible states of a file
+OK = 'ok'
+MISSING = 'missing'
+CORRUPT = 'corrupt'
+
+
+def hash_file(path):
+    '''Returns the SHA-1 hash of a file.
+
+    Args:
+        path (str):
+            The path to the file.
+    '''
+
+    digest = hashlib.sha1()
+    buffer = bytearray(CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, 'rb') as file:
+        while True:
+            size = file.readinto(buffer)
+            if not size:
+                break
+            digest.update(view[:size])
+    return digest.hexdigest()
+
+
+class IntegrityVerifier:
+    '''Verifies and repairs the files of the game's installation.
+
+    Files are hashed on a pool of threads. The hash of each file is
+    cached along with its size and modification time, so repeated
+    verifications only hash the files that changed since.
+
+    Args:
+        directory (str):
+            The directory of the game's installation.
+        cache_path (str):
+            The full path to the file the hashes are cached in.
+        workers (int):
+            The number of files to hash at once. Defaults to 4.
+        platform (str):
+            The platform to verify files for, as named in the patch
+            manifest. Defaults to "darwin".
+    '''
+
+    def __init__(self, directory, cache_path, workers=4, platform='darwin'):
+        '''Please see help(IntegrityVerifier) for more info.'''
+
+        self.directory = directory
+        self.cache_path = cache_path
+        self.workers = workers
+        self.platform = platform
+
+    def fetch_manifest(self, timeout=10):
+        '''Downloads the patch manifest.
+
+        Returns a dictionary of the files that belong on this platform
+        and their expected hashes and download names. Raises ValueError
+        if the manifest is malformed. Files that would be written
+        outside of the installation are left out.
+
+        Args:
+            timeout (int or float):
+                The number of seconds to wait for the server. Defaults
+                to 10.
+        '''
+
+        response = requests.get(MANIFEST_URL, timeout=timeout)
+        response.raise_for_status()
+        files = response.json()
+        if not isinstance(files, dict):
+            raise ValueError('The patch manifest is malformed.')
+
+        manifest = {}
+        root = os.path.realpath(self.directory)
+        for path, entry in files.items():
+            # Check the shape of each entry before anything relies on it
+            if (
+                not isinstance(entry, dict)
+                or not isinstance(entry.get('hash'), str)
+                or not isinstance(entry.get('dl'), str)
+                or not isinstance(entry.get('only', []), list)
+            ):
+                raise ValueError(f'The manifest entry {path} is malformed.')
+            if self.platform not in entry.get('only', [self.platform]):
+                continue
+
+            # Skip files that would escape the installation or its downloads
+            destination = os.path.realpath(os.path.join(root, path))
+            if (
+                destination == root
+                or os.path.commonpath([root, destination]) != root
+                or entry['dl'] in ('', '.', '..')
+                or os.path.basename(entry['dl']) != entry['dl']
+            ):
+                events.warning('install.unsafe_path', path=path)
+                continue
+            manifest[path] = entry
+        return manifest
+
+    def verify(self, manifest):
+        '''Checks every file in the manifest.
+
+        Returns a dictionary of the files that are missing or corrupt
+        and their states.
+
+        Args:
+            manifest (dict):
+                The patch manifest, as returned by fetch_manifest.
+        '''
+
+        cache = self._read_cache()
+        problems = {}
+        pending = {}
+
+        # Only hash the files whose size or modification time changed
+        for path, entry in manifest.items():
+            try:
+                stat = os.stat(os.path.join(self.directory, path))
+            except OSError:
+                problems[path] = MISSING
+                continue
+            key = [stat.st_size, stat.st_mtime_ns]
+            cached = cache.get(path)
+            if cached and cached[:2] == key:
+                if cached[2] != entry['hash']:
+                    problems[path] = CORRUPT
+            else:
+                pending[path] = key
+
+        # Hash the remaining files concurrently
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as pool:
+            futures = {
+                path: pool.submit(hash_file, os.path.join(self.directory, path))
+                for path in pending
+            }
+            for path, future in futures.items():
+                try:
+                    digest = future.result()
+                except OSError:
+                    problems[path] = MISSING
+                    continue
+                cache[path] = pending[path] + [digest]
+                if digest != manifest[path]['hash']:
+                    problems[path] = CORRUPT
+
+        self._write_cache(cache)
+        return problems
+
+    def repair(self, manifest, problems, timeout=30):
+        '''Downloads fresh copies of the problematic files.
+
+        Each file is downloaded next to the original, checked against
+        the manifest and only then moved into place.
+
+        Returns a list of the files that could not be repaired.
+
+        Args:
+            manifest (dict):
+                The patch manifest, as returned by fetch_manifest.
+            problems (dict):
+                The problematic files, as returned by verify.
+            timeout (int or float):
+                The number of seconds to wait for the server. Defaults
+                to 30.
+        '''
+
+        failed = []
+        for path in problems:
+            try:
+                self._download(path, manifest[path], timeout)
+            except (OSError, ValueError, requests.RequestException):
+                failed.append(path)
+        return failed
+
+    def _download(self, path, entry, timeout):
+        '''Downloads and decompresses a single file.
+
+        Args:
+            path (str):
+                The path of the file relative to the installation.
+            entry (dict):
+                The file's entry in the patch manifest.
+            timeout (int or float):
+                The number of seconds to wait for the server.
+        '''
+
+        destination = os.path.join(self.directory, path)
+        temporary = f'{destination}.download'
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+
+        # Decompress the file as it is downloaded
+        decompressor = bz2.BZ2Decompressor()
+        digest = hashlib.sha1()
+        try:
+            with requests.get(
+                PATCHES_URL + entry['dl'],
+                stream=True,
+                timeout=timeout,
+            ) as response:
+                response.raise_for_status()
+                with open(temporary, 'wb') as file:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        data = decompressor.decompress(chunk)
+                        digest.update(data)
+                        file.write(data)
+
+            # Only replace the original if the download is correct
+            if digest.hexdigest() != entry['hash']:
+                raise ValueError(f'The download of {path} is corrupt.')
+            os.replace(temporary, destination)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def _read_cache(self):
+        '''Returns the cached hashes, or an empty dictionary.'''
+
+        try:
+            with open(self.cache_path) as cache:
+                hashes = json.load(cache)
+        except (OSError, ValueError):
+            return {}
+        return hashes if isinstance(hashes, dict) else {}
+
+    def _write_cache(self, cache):
+        '''Caches the hashes in a file.
+
+        Args:
+            cache (dict):
+                A dictionary of relative paths and lists of their size,
+                modification time and hash.
+        '''
+
+        temporary = f'{self.cache_path}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(cache, file)
+        os.replace(temporary, self.cache_path)
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.invasions module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The invasions module for the MultiTooner application. Contains classes
+for getting detailed invasion information and displaying it in the
+menu bar.
+'''
+
+import json
+import os
+import time
+
+import requests
+import rumps
+import tooner
+
+import breaker
+import estimator
+import events
+
+
+# The key of the row that is shown when there are no invasions to show
+PLACEHOLDER = 'No Current Invasions'
+
+
+def get_cogs(details):
+    '''Returns a dictionary of invaded districts and their invading cog.
+
+    Args:
+        details (dict):
+            A dictionary of invaded districts and tuples of their
+            invading cog and progress, as returned by
+            InvasionTracker.get_details.
+    '''
+
+    return {district: cog for district, (cog, _) in details.items()}
+
+
+def diff_invasions(previous, current):
+    '''Returns the invasions that are new since the previous check.
+
+    An invasion is new if its district wasn't invaded before, or if it
+    is now being invaded by a different cog.
+
+    Args:
+        previous (dict):
+            The invaded districts and their cogs at the previous check.
+        current (dict):
+            The invaded districts and their cogs now.
+    '''
+
+    return set(current.items()) - set(previous.items())
+
+
+def save_state(path, invasions):
+    '''Saves the current invasions along with the time they were seen.
+
+    The file is replaced atomically, so a crash while saving never
+    leaves a partially written state behind.
+
+    Args:
+        path (str):
+            The full path to the state file.
+        invasions (dict):
+            The invaded districts and their cogs.
+    '''
+
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as state:
+        json.dump({'time': time.time(), 'invasions': invasions}, state)
+    os.replace(temporary, path)
+
+
+def load_state(path, max_age):
+    '''Loads the invasions that were saved, if they are recent enough.
+
+    Returns an empty dictionary if there is no saved state, or if it is
+    older than the maximum age.
+
+    Args:
+        path (str):
+            The full path to the state file.
+        max_age (int or float):
+            The maximum age of the state in seconds.
+    '''
+
+    try:
+        with open(path) as state:
+            saved = json.load(state)
+        age = time.time() - saved['time']
+        invasions = dict(saved['invasions'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return {}
+    return invasions if 0 <= age <= max_age else {}
+
+
+class InvasionTracker(tooner.InvasionTracker):
+    '''Pulls detailed invasion information from the Toontown Rewritten API.
+
+    A subclass of tooner.InvasionTracker that exposes the progress of
+    each invasion in addition to the invading cog, using only a single
+    request to the API. Requests time out, and go through the shared
+    circuit breaker so that they fail fast while the API is down.
+
+    Args:
+        timeout (int or float):
+            The number of seconds to wait for the API. Defaults to 5.
+    '''
+
+    def __init__(self, timeout=5):
+        '''Please see help(InvasionTracker) for more info.'''
+
+        super().__init__()
+        self.timeout = timeout
+
+    def get_details(self):
+        '''Returns the cog and progress of each current invasion.
+
+        The keys of the returned dictionary are the invaded districts,
+        and the values are tuples of the invading cog and the progress
+        of the invasion (e.g. "1234/4000").
+        '''
+
+        return {
+            district: (
+                self._clean(invasion['type']),
+                invasion.get('progress', ''),
+            )
+            for district, invasion in self._invasions.items()
+        }
+
+    def _make_request(self):
+        '''Makes a get request to the Toontown Rewritten API.
+
+        Raises a breaker.CircuitOpenError without making the request if 
+        the API has been failing.
+        '''
+
+        return breaker.TTR_API.call(self._get)
+
+    def _get(self):
+        '''Returns the API's json response, raising on any error.'''
+
+        response = requests.get(self.api_url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+
+class InvasionsMenu:
+    '''Manages the "Current Invasions" submenu.
+
+    Rather than rebuilding the submenu on every poll, only the rows
+    that actually changed are touched: rows are added and removed as
+    districts are invaded and freed, and titles are only set when their
+    text differs. Redraws are also throttled, so that updates arriving
+    faster than the throttle are coalesced into a single redraw.
+
+    Args:
+        menu_item (rumps.MenuItem):
+            The menu item that will hold the invasion rows.
+        throttle (int or float):
+            The minimum number of seconds between redraws. Defaults to 5.
+    '''
+
+    def __init__(self, menu_item, throttle=5):
+        '''Please see help(InvasionsMenu) for more info.'''
+
+        # Store parameters
+        self._item = menu_item
+        self._throttle = throttle
+
+        # Keep a reference to each row, keyed by district
+        self._rows = {}
+        self._pending = None
+        self._last_redraw = 0
+
+        # Create a timer to redraw changes that arrive too quickly
+        self._deferred = rumps.Timer(self._flush, self._throttle)
+
+        # Show a placeholder until the first update arrives
+        self._placeholder = rumps.MenuItem(PLACEHOLDER)
+        self._item.add(self._placeholder)
+
+    def update(self, details, ends=None):
+        '''Schedules the submenu to show the specified invasions.
+
+        Args:
+            details (dict):
+                A dictionary of invaded districts and tuples of their
+                invading cog and progress, as returned by
+                InvasionTracker.get_details.
+            ends (dict):
+                A dictionary of invaded districts and the predicted end
+                of their invasions, as returned by
+                estimator.InvasionEstimator.update. Defaults to None.
+        '''
+
+        self._pending = (details, ends or {})
+        # Redraw now if enough time has passed, otherwise wait for the timer
+        if time.monotonic() - self._last_redraw >= self._throttle:
+            self._redraw()
+        elif not self._deferred.is_alive():
+            self._deferred.start()
+
+    def clear(self, message=PLACEHOLDER):
+        '''Removes every row and shows the specified placeholder message.
+
+        Args:
+            message (str):
+                The text of the placeholder row.
+        '''
+
+        self._deferred.stop()
+        self._pending = None
+        for district in list(self._rows):
+            del self._item[district]
+        self._rows.clear()
+        self._set_placeholder(message)
+
+    @events.dump_on_error
+    def _flush(self, sender):
+        '''Redraws any pending changes when the deferral timer fires.
+
+        A timer fires as soon as it is started, so the flush is skipped 
+        until the throttle has actually passed since the last redraw.
+        '''
+
+        if time.monotonic() - self._last_redraw < self._throttle:
+            return
+        self._deferred.stop()
+        if self._pending is not None:
+            self._redraw()
+
+    def _redraw(self):
+        '''Applies the pending invasions to the submenu.'''
+
+        # Take the pending invasions and note the time of the redraw
+        (details, ends), self._pending = self._pending, None
+        self._last_redraw = time.monotonic()
+
+        # Remove rows for districts that are no longer invaded
+        for district in [d for d in self._rows if d not in details]:
+            del self._item[district]
+            del self._rows[district]
+
+        # Add rows for new invasions and retitle rows that changed
+        for district in sorted(details):
+            cog, progress = details[district]
+            if ends.get(district):
+                end = estimator.format_time(ends[district])
+                progress = f'{progress}, ends ~{end}'
+            title = f'{district}: {cog} ({progress})'
+            item = self._rows.get(district)
+            if item is None:
+                self._insert_row(district, title)
+            elif item.title != title:
+                item.title = title
+
+        # Only show the placeholder if there are no invasions
+        self._set_placeholder(None if self._rows else PLACEHOLDER)
+
+    def _insert_row(self, district, title):
+        '''Inserts a row for the district in alphabetical order.
+
+        The row is keyed by its district so that its title can change
+        without needing to replace the row.
+
+        Args:
+            district (str):
+                The name of the invaded district.
+            title (str):
+                The text to display in the row.
+        '''
+
+        item = rumps.MenuItem(district)
+        following = next((d for d in sorted(self._rows) if d > district), None)
+        if following is None:
+            self._item.add(item)
+        else:
+            self._item.insert_before(following, item)
+        item.title = title
+        self._rows[district] = item
+
+    def _set_placeholder(self, message):
+        '''Shows the placeholder with the given message, or hides it.
+
+        Args:
+            message (str or None):
+                The text of the placeholder, or None to hide it.
+        '''
+
+        present = PLACEHOLDER in self._item
+        if message is None:
+            if present:
+                del self._item[PLACEHOLDER]
+            return
+        if not present:
+            # The row is keyed by its title at the time it is added
+            self._placeholder.title = PLACEHOLDER
+            self._item.add(self._placeholder)
+        if self._placeholder.title != message:
+            self._placeholder.title = message
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.launcher module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The launcher module for the MultiTooner application. Contains a
+launcher that reports whether the game was actually launched.
+'''
+
+import requests
+import tooner
+
+import breaker
+
+
+class Launcher(tooner.ToontownLauncher):
+    '''Logs in and launches the game, reporting whether it succeeded.
+
+    A subclass of tooner.ToontownLauncher whose play method returns
+    whether or not the game process was started, since the base class
+    doesn't return anything. Requests to the login API time out, and go
+    through the shared circuit breaker so that they fail fast while the
+    API is down.
+
+    Please see help(tooner.ToontownLauncher) for information on other
+    parameters.
+
+    Args:
+        timeout (int or float):
+            The number of seconds to wait for the API. Defaults to 10.
+    '''
+
+    def __init__(self, *args, timeout=10, **kwargs):
+        '''Please see help(Launcher) for more info.'''
+
+        super().__init__(*args, **kwargs)
+        self.timeout = timeout
+        self.launched = False
+
+    def play(self, **data):
+        '''Logs in and launches the game.
+
+        Returns True if the game process was started, otherwise False.
+        '''
+
+        self._connect(**data)
+        return self.launched
+
+    def _make_request(self, data):
+        '''Posts a request to the Toontown Rewritten API.
+
+        Raises a breaker.CircuitOpenError without making the request if 
+        the API has been failing.
+
+        Args:
+            data (dict):
+                The data to send with the request.
+        '''
+
+        return breaker.TTR_API.call(self._post, data)
+
+    def _post(self, data):
+        '''Returns the API's json response, raising on any error.
+
+        Args:
+            data (dict):
+                The data to send with the request.
+        '''
+
+        response = requests.post(
+            self.api_url,
+            data=data,
+            headers={'Content-type': 'application/x-www-form-urlencoded'},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _launch_game(self, play_cookie, game_server):
+        '''Launches the game and notes that it was launched.'''
+
+        super()._launch_game(play_cookie, game_server)
+        self.launched = True
@@ -5,9 +5,15 @@ multitooner.login module
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 The login module for the MultiTooner application. Contains 
-functions for the modifying the user's login items.
+backends for making the application run at login.
 
-The bulk of the script was taken from:
+The LaunchAgent backend is the default: it writes a property list to 
+~/Library/LaunchAgents, so checking whether it is enabled is a single 
+file stat. The legacy backend modifies the user's login items through 
+the deprecated LSSharedFileList APIs, and the memory backend only keeps 
+its state in memory, which is useful for testing.
+
+The bulk of the legacy backend was taken from:
 https://github.com/pudquick/pyLoginItems/blob/master/pyLoginItems.py
 However, one modification had to be made to actually get it to work, 
 and the remaining modifications were made to make its style more in 
@@ -18,36 +24,244 @@ go to the following respository, where a similar module can be found:
 https://github.com/dougn/HalfCaff
 '''
 
-from platform import mac_ver
+import os
+import plistlib
 
-from Foundation import NSURL, NSBundle
-from LaunchServices import (kLSSharedFileListNoUserInteraction,
-                            kLSSharedFileListSessionLoginItems)
+import events
 
-# Need to manually load in 10.11.x+
-os_vers = int(mac_ver()[0].split('.')[1])
-if os_vers > 10:
-    from Foundation import NSBundle
+# The legacy backend needs PyObjC, which only exists on macOS
+try:
     import objc
-    SFL_bundle = NSBundle.bundleWithIdentifier_('com.apple.coreservices.SharedFileList')
-    functions  = [
-        ('LSSharedFileListCreate',              b'^{OpaqueLSSharedFileListRef=}^{__CFAllocator=}^{__CFString=}@'),
-        ('LSSharedFileListCopySnapshot',        b'^{__CFArray=}^{OpaqueLSSharedFileListRef=}o^I'),
-        ('LSSharedFileListItemCopyDisplayName', b'^{__CFString=}^{OpaqueLSSharedFileListItemRef=}'),
-        ('LSSharedFileListItemResolve',         b'i^{OpaqueLSSharedFileListItemRef=}Io^^{__CFURL=}o^{FSRef=[80C]}'),
-        ('LSSharedFileListItemMove',            b'i^{OpaqueLSSharedFileListRef=}^{OpaqueLSSharedFileListItemRef=}^{OpaqueLSSharedFileListItemRef=}'),
-        ('LSSharedFileListItemRemove',          b'i^{OpaqueLSSharedFileListRef=}^{OpaqueLSSharedFileListItemRef=}'),
-        ('LSSharedFileListInsertItemURL',       b'^{OpaqueLSSharedFileListItemRef=}^{OpaqueLSSharedFileListRef=}^{OpaqueLSSharedFileListItemRef=}^{__CFString=}^{OpaqueIconRef=}^{__CFURL=}^{__CFDictionary=}^{__CFArray=}'),
-        ('kLSSharedFileListItemBeforeFirst',    b'^{OpaqueLSSharedFileListItemRef=}'),
-        ('kLSSharedFileListItemLast',           b'^{OpaqueLSSharedFileListItemRef=}'),]
-    objc.loadBundleFunctions(SFL_bundle, globals(), functions)
-else:
-    from LaunchServices import kLSSharedFileListItemBeforeFirst, kLSSharedFileListItemLast, \
-                               LSSharedFileListCreate, LSSharedFileListCopySnapshot, \
-                               LSSharedFileListItemCopyDisplayName, LSSharedFileListItemResolve, \
-                               LSSharedFileListItemMove, LSSharedFileListItemRemove, \
-                               LSSharedFileListInsertItemURL
+    from Foundation import NSURL, NSBundle
+    import LaunchServices
+    from LaunchServices import (kLSSharedFileListNoUserInteraction,
+                                kLSSharedFileListSessionLoginItems)
+except ImportError:
+    objc = NSURL = NSBundle = LaunchServices = None
+    kLSSharedFileListNoUserInteraction = None
+    kLSSharedFileListSessionLoginItems = None
+
+# The LSSharedFileList functions and their signatures
+_SHARED_FILE_LIST = [
+    ('LSSharedFileListCreate',              b'^{OpaqueLSSharedFileListRef=}^{__CFAllocator=}^{__CFString=}@'),
+    ('LSSharedFileListCopySnapshot',        b'^{__CFArray=}^{OpaqueLSSharedFileListRef=}o^I'),
+    ('LSSharedFileListItemCopyDisplayName', b'^{__CFString=}^{OpaqueLSSharedFileListItemRef=}'),
+    ('LSSharedFileListItemResolve',         b'i^{OpaqueLSSharedFileListItemRef=}Io^^{__CFURL=}o^{FSRef=[80C]}'),
+    ('LSSharedFileListItemMove',            b'i^{OpaqueLSSharedFileListRef=}^{OpaqueLSSharedFileListItemRef=}^{OpaqueLSSharedFileListItemRef=}'),
+    ('LSSharedFileListItemRemove',          b'i^{OpaqueLSSharedFileListRef=}^{OpaqueLSSharedFileListItemRef=}'),
+    ('LSSharedFileListInsertItemURL',       b'^{OpaqueLSSharedFileListItemRef=}^{OpaqueLSSharedFileListRef=}^{OpaqueLSSharedFileListItemRef=}^{__CFString=}^{OpaqueIconRef=}^{__CFURL=}^{__CFDictionary=}^{__CFArray=}'),
+    ('kLSSharedFileListItemBeforeFirst',    b'^{OpaqueLSSharedFileListItemRef=}'),
+    ('kLSSharedFileListItemLast',           b'^{OpaqueLSSharedFileListItemRef=}'),]
+
+_functions = {}
+if LaunchServices is not None:
+    if hasattr(LaunchServices, 'LSSharedFileListCreate'):
+        # Older versions of macOS still export the functions
+        _functions = {
+            name: getattr(LaunchServices, name)
+            for name, _ in _SHARED_FILE_LIST
+        }
+    else:
+        # Need to manually load in 10.11.x+
+        SFL_bundle = NSBundle.bundleWithIdentifier_('com.apple.coreservices.SharedFileList')
+        objc.loadBundleFunctions(SFL_bundle, _functions, _SHARED_FILE_LIST)
+LSSharedFileListCreate = _functions.get('LSSharedFileListCreate')
+LSSharedFileListCopySnapshot = _functions.get('LSSharedFileListCopySnapshot')
+LSSharedFileListItemCopyDisplayName = _functions.get('LSSharedFileListItemCopyDisplayName')
+LSSharedFileListItemResolve = _functions.get('LSSharedFileListItemResolve')
+LSSharedFileListItemMove = _functions.get('LSSharedFileListItemMove')
+LSSharedFileListItemRemove = _functions.get('LSSharedFileListItemRemove')
+LSSharedFileListInsertItemURL = _functions.get('LSSharedFileListInsertItemURL')
+kLSSharedFileListItemBeforeFirst = _functions.get('kLSSharedFileListItemBeforeFirst')
+kLSSharedFileListItemLast = _functions.get('kLSSharedFileListItemLast')
+
+
+# The label of the application's LaunchAgent
+LAUNCH_AGENT_LABEL = 'com.jakebrehm.multitooner'
+
+
+def get_backend(name='launchagent'):
+    '''Returns the run at login backend with the specified name.
+
+    An unknown name is logged and the LaunchAgent backend is used.
+
+    Args:
+        name (str):
+            Either "launchagent", "legacy" or "memory". Defaults to 
+            "launchagent".
+    '''
+
+    backends = {
+        'launchagent': LaunchAgentBackend,
+        'legacy': SharedFileListBackend,
+        'memory': MemoryBackend,
+    }
+    if name not in backends:
+        events.warning('login.unknown_backend', name=name)
+        name = 'launchagent'
+    return backends[name]()
+
+
+def get_application_path():
+    '''Returns the path to the application bundle.'''
+
+    return NSBundle.mainBundle().bundlePath()
+
+
+class LoginBackend:
+    '''Base class for run at login backends.'''
+
+    def is_enabled(self):
+        '''Returns whether or not the application runs at login.'''
+
+        raise NotImplementedError
+
+    def enable(self):
+        '''Makes the application run at login.'''
+
+        raise NotImplementedError
+
+    def disable(self):
+        '''Stops the application from running at login.'''
+
+        raise NotImplementedError
+
+    def migrate(self):
+        '''Takes over from the login item of older versions, if any.
+
+        Returns whether or not anything was migrated. Most backends have 
+        nothing to migrate.
+        '''
+
+        return False
+
+
+class LaunchAgentBackend(LoginBackend):
+    '''Runs the application at login with a LaunchAgent.
+
+    The application runs at login if and only if its LaunchAgent 
+    property list exists, so checking the state is a single file stat 
+    rather than an enumeration of every login item on the system.
+
+    Older versions of the application added a login item instead, which 
+    is replaced by the LaunchAgent (see help(LaunchAgentBackend.migrate)) 
+    so that the application isn't opened twice at login.
+
+    Args:
+        directory (str):
+            The directory to write the property list to. Defaults to 
+            None, in which case ~/Library/LaunchAgents is used.
+        legacy (LoginBackend):
+            The backend of older versions. Defaults to None, in which 
+            case a SharedFileListBackend is used.
+    '''
+
+    def __init__(self, directory=None, legacy=None):
+        '''Please see help(LaunchAgentBackend) for more info.'''
+
+        if directory is None:
+            directory = os.path.expanduser('~/Library/LaunchAgents')
+        self.path = os.path.join(directory, f'{LAUNCH_AGENT_LABEL}.plist')
+        self._legacy = legacy if legacy is not None else SharedFileListBackend()
+
+    def is_enabled(self):
+        '''Returns whether or not the LaunchAgent exists.'''
+
+        return os.path.exists(self.path)
 
+    def enable(self):
+        '''Writes the LaunchAgent that opens the application at login.'''
+
+        agent = {
+            'Label': LAUNCH_AGENT_LABEL,
+            'ProgramArguments': ['/usr/bin/open', '-a', get_application_path()],
+            'RunAtLoad': True,
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'wb') as file:
+            plistlib.dump(agent, file)
+        # Never open the application twice at login
+        if self._legacy.is_enabled():
+            self._legacy.disable()
+
+    def migrate(self):
+        '''Replaces the login item of older versions with the LaunchAgent.
+
+        Checking for the login item means enumerating every login item, 
+        so this should be done off the main thread.
+        '''
+
+        if self.is_enabled() or not self._legacy.is_enabled():
+            return False
+        self.enable()
+        events.info('login.migrate', path=self.path)
+        return True
+
+    def disable(self):
+        '''Removes the LaunchAgent.'''
+
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class SharedFileListBackend(LoginBackend):
+    '''Runs the application at login with a login item.
+
+    Uses the deprecated LSSharedFileList APIs, which need every login 
+    item on the system to be enumerated and resolved to check the state. 
+    Without PyObjC, the application is never a login item.
+    '''
+
+    def is_enabled(self):
+        '''Returns whether or not the application is a login item.'''
+
+        if LaunchServices is None:
+            return False
+        return get_application_path() in list_login_items()
+
+    def enable(self):
+        '''Adds the application to the user's login items.'''
+
+        add_login_item(get_application_path())
+
+    def disable(self):
+        '''Removes the application from the user's login items.'''
+
+        remove_login_item(get_application_path())
+
+
+class MemoryBackend(LoginBackend):
+    '''Only keeps the run at login state in memory, for testing.
+
+    Args:
+        enabled (bool):
+            The initial state. Defaults to False.
+    '''
+
+    def __init__(self, enabled=False):
+        '''Please see help(MemoryBackend) for more info.'''
+
+        self.enabled = enabled
+
+    def is_enabled(self):
+        '''Returns the state kept in memory.'''
+
+        return self.enabled
+
+    def enable(self):
+        '''Sets the state kept in memory.'''
+
+        self.enabled = True
+
+    def disable(self):
+        '''Clears the state kept in memory.'''
+
+        self.enabled = False
+
+
+# The following functions make up the legacy backend
 
 def _get_login_items():
     # Setup the type of shared list reference we want
@@ -160,16 +374,3 @@ def add_login_item(path_to_item, position=-1):
                 destination_point = current_items[i]
             # Add ourselves after the file
             result = LSSharedFileListInsertItemURL(list_ref, destination_point, None, None, added_item, {}, [])
-
-# The following functions are custom
-
-APP_DIRECTORY = NSBundle.mainBundle().bundlePath()
-
-def run_at_login_is_enabled():
-    return APP_DIRECTORY in list_login_items()
-
-def enable_run_at_login():
-    add_login_item(APP_DIRECTORY)
-
-def disable_run_at_login():
-    remove_login_item(APP_DIRECTORY)
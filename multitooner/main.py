@@ -5,25 +5,291 @@ multitooner.main module
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 The main module for the MultiTooner application. Combines all modules.
+
+Running the module without a command starts the menu bar application,
+unless it is already running, in which case the running instance is
+notified instead. Accounts can be launched through the running instance
+(starting it if necessary), and managed from the command line, e.g.:
+    python main.py launch main alt
+
+    python main.py import accounts.csv
+    python main.py export accounts.json
+    python main.py verify
+
+Invasion responses can be recorded while the application runs, and
+replayed later, either through the running application or as fast as
+possible to benchmark the invasion pipeline:
+    python main.py --record invasions.jsonl.gz
+    python main.py --replay invasions.jsonl.gz --speed 60
+    python main.py benchmark invasions.jsonl.gz
 '''
 
-import rumps
+import argparse
+import sys
+import time
 
-import app
+import instance
+import support
+
+# The rest of the application is only imported when it is needed, so that
+# a second launch can hand off to the running instance and exit quickly
 
 
 class MultiTooner:
 
-    def start(self, debug=False):
+    def start(self, debug=False, record=None, replay=None, speed=1,
+              intent=None):
         '''Starts the application.
-        
+
+        If the application is already running, the intent is forwarded 
+        to the running instance instead, without loading the rest of 
+        the application.
+
         Args:
             debug (bool):
                 Whether or not to run in debug mode. Defaults to False.
+            record (str):
+                The path to record invasion responses to. Defaults to 
+                None, in which case nothing is recorded.
+            replay (str):
+                The path to a recording to replay instead of polling 
+                the API. Defaults to None.
+            speed (int or float):
+                How many times faster than real time to replay the 
+                recording. Defaults to 1.
+            intent (dict):
+                What the application should do once started, such as 
+                {"command": "launch", "accounts": ["main"]}. Defaults 
+                to None, in which case the application is only started.
+        '''
+
+        intent = intent or {'command': 'activate'}
+        socket_path = support.application_support(instance.SOCKET_FILENAME)
+
+        # Hand off to the running instance if there is one
+        self._lock = instance.InstanceLock(
+            support.application_support(instance.LOCK_FILENAME)
+        )
+        if not self._lock.acquire():
+            if not instance.forward(socket_path, intent):
+                sys.exit('MultiTooner is already running but did not respond.')
+            return
+
+        import app
+        from PyObjCTools import AppHelper
+        menu_bar = app.MenuBar(name="MultiTooner", quit_button="Quit")
+        menu_bar.listen(socket_path)
+        if record:
+            menu_bar.record_invasions(record)
+        if replay:
+            menu_bar.replay_invasions(replay, speed=speed)
+        if intent['command'] != 'activate':
+            AppHelper.callAfter(menu_bar.handle_intent, intent)
+        menu_bar.start(debug=debug)
+
+    def import_accounts(self, path):
+        '''Imports accounts from a CSV or JSON file.
+
+        The whole file is validated before anything is added, and then
+        every account is added to the configuration file in a single
+        write.
+
+        Args:
+            path (str):
+                The path to the .csv or .json file to import from.
+        '''
+
+        import bulk
+        import config
+
+        folder = support.SupportFolder()
+        configuration = config.Configuration(folder, config.FILENAME)
+        accounts = bulk.read_accounts(path)
+        bulk.validate_accounts(accounts, configuration.accounts)
+        configuration.add_accounts(accounts)
+        print(f'Imported {len(accounts)} account(s).')
+
+    def export_accounts(self, path):
+        '''Exports all configured accounts to a CSV or JSON file.
+
+        Args:
+            path (str):
+                The path to the .csv or .json file to export to.
+        '''
+
+        import bulk
+        import config
+
+        folder = support.SupportFolder()
+        configuration = config.Configuration(folder, config.FILENAME)
+        accounts = [
+            (name, *configuration.get_account(name))
+            for name in configuration.accounts
+        ]
+        bulk.write_accounts(path, accounts)
+        print(f'Exported {len(accounts)} account(s).')
+
+
+    def verify_accounts(self):
+        '''Verifies the login information of every account concurrently.
+
+        Returns True if no account's login information was rejected.
+        '''
+
+        import config
+        import health
+
+        folder = support.SupportFolder()
+        configuration = config.Configuration(folder, config.FILENAME)
+        checker = health.CredentialChecker(
+            max_workers=configuration.get_setting('verify_workers'),
+        )
+        futures = checker.check_all(
+            {
+                name: configuration.get_account(name)
+                for name in configuration.accounts
+            },
+            lambda name, result: print(f'{name}: {result}'),
+        )
+        results = [future.result() for future in futures.values()]
+        return health.INVALID not in results
+
+    def benchmark(self, path):
+        '''Replays a recording through the invasion pipeline.
+
+        Every recorded poll is diffed against the previous one as fast 
+        as possible, counting the notifications that would have been 
+        sent rather than sending them.
+
+        Args:
+            path (str):
+                The path to the recording.
         '''
-        
-        app.MenuBar(name="MultiTooner", quit_button="Quit").start(debug=debug)
+
+        import invasions
+        import replay
+
+        state = {'previous': {}, 'polls': 0, 'notifications': 0}
+
+        def process(details):
+            current = invasions.get_cogs(details)
+            new = invasions.diff_invasions(state['previous'], current)
+            state['notifications'] += len(new)
+            state['polls'] += 1
+            state['previous'] = current
+
+        start = time.perf_counter()
+        replay.replay(path, process)
+        elapsed = time.perf_counter() - start
+        print(
+            f"Replayed {state['polls']} poll(s) with "
+            f"{state['notifications']} notification(s) in {elapsed:.3f} s."
+        )
+
+
+def replay_speed(value):
+    '''Parses a replay speed, which can't be negative.
+
+    Args:
+        value (str):
+            The speed, as given on the command line.
+    '''
+
+    try:
+        speed = float(value)
+    except ValueError:
+        speed = -1
+    if not speed >= 0:
+        raise argparse.ArgumentTypeError(f'invalid speed: {value}')
+    return speed
+
+
+def parse_arguments(argv=None):
+    '''Parses the command line arguments.
+
+    Unknown arguments are ignored, since macOS may pass its own
+    arguments to the frozen application.
+
+    Args:
+        argv (list):
+            The arguments to parse. Defaults to None, in which case
+            sys.argv is used.
+    '''
+
+    parser = argparse.ArgumentParser(
+        prog='multitooner',
+        description='A Toontown Rewritten companion for MacOS.',
+    )
+    commands = parser.add_subparsers(dest='command')
+    import_parser = commands.add_parser(
+        'import',
+        help='import accounts from a .csv or .json file',
+    )
+    import_parser.add_argument('path')
+    export_parser = commands.add_parser(
+        'export',
+        help='export accounts to a .csv or .json file',
+    )
+    export_parser.add_argument('path')
+    launch_parser = commands.add_parser(
+        'launch',
+        help='launch accounts, or every account if none are named',
+    )
+    launch_parser.add_argument('accounts', nargs='*')
+    commands.add_parser(
+        'verify',
+        help='verify the login information of every account',
+    )
+    benchmark_parser = commands.add_parser(
+        'benchmark',
+        help='replay a recording of invasions as fast as possible',
+    )
+    benchmark_parser.add_argument('path')
+    parser.add_argument(
+        '--record',
+        metavar='PATH',
+        help='record invasion responses to a file',
+    )
+    parser.add_argument(
+        '--replay',
+        metavar='PATH',
+        help='replay recorded invasion responses instead of polling',
+    )
+    parser.add_argument(
+        '--speed',
+        type=replay_speed,
+        default=1,
+        help='how many times faster than real time to replay (0 for no delay)',
+    )
+    arguments, _ = parser.parse_known_args(argv)
+    return arguments
 
 
 if __name__ == '__main__':
-    MultiTooner().start(debug=True)
+    arguments = parse_arguments()
+    multitooner = MultiTooner()
+    if arguments.command is None:
+        multitooner.start(
+            debug=True,
+            record=arguments.record,
+            replay=arguments.replay,
+            speed=arguments.speed,
+        )
+    elif arguments.command == 'launch':
+        multitooner.start(
+            debug=True,
+            intent={'command': 'launch', 'accounts': arguments.accounts},
+        )
+    else:
+        try:
+            if arguments.command == 'import':
+                multitooner.import_accounts(arguments.path)
+            elif arguments.command == 'export':
+                multitooner.export_accounts(arguments.path)
+            elif arguments.command == 'verify':
+                if not multitooner.verify_accounts():
+                    sys.exit(1)
+            elif arguments.command == 'benchmark':
+                multitooner.benchmark(arguments.path)
+        except (OSError, ValueError) as error:
+            sys.exit(f'Error: {error}')
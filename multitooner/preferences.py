@@ -8,8 +8,12 @@ The preferences module for the MultiTooner application. Contains
 classes for the application's Preference windows.
 '''
 
+import os
+
 import rumps
 
+import bulk
+
 
 class AddAccount(rumps.Window):
     '''A window that allows the user to add an account.
@@ -166,3 +170,138 @@ class RemoveAccount(rumps.Window):
             len(text) == 1,
             text[0] in self._application.accounts,
         ])
+
+
+class ImportAccounts(rumps.Window):
+    '''A window that allows the user to import accounts from a file.
+
+    A very basic wrapper around rumps.Window with preset titles, text, 
+    etc. It includes one supplementary method that handles looping of 
+    the rumps.Window.run() method if incorrect input is received, as 
+    well as reading and validating the accounts in the file.
+
+    Upon valid input, the list of accounts to import will be returned.
+
+    Args:
+        application (multitooner.app.Application object):
+            A reference to the main Application object.
+    '''
+
+    def __init__(self, application):
+        '''Please see help(ImportAccounts) for more info.'''
+
+        # Store parameters and initalize the base message of the window
+        self._application = application
+        self._base_message = (
+            'Enter the path to a .csv or .json file of accounts.\n\n'
+            'The file must have a name, username, and password for each '
+            'account. No accounts will be added unless all of them are valid.'
+        )
+
+        # Initialize and set up the class
+        super().__init__(ok='Import', cancel='Cancel', dimensions=(295, 24))
+        self.title = 'Import Accounts'
+        self.message = self._base_message
+        self.default_text = '~/accounts.csv'
+        self.icon = None
+
+    def get_input(self):
+        '''Run the window until valid input is received.
+        
+        Continuously run the window until the user either cancels or 
+        enters the path to a file of valid accounts. The whole file is 
+        read and validated before anything is returned.
+        '''
+
+        # Loop continuously until cancelled or valid input is received
+        while True:
+            # Display the window and wait for the user's response
+            response = self.run()
+            if response.clicked:
+                # If the user presses "Import", read and validate the file
+                path = os.path.expanduser(response.text.strip())
+                try:
+                    accounts = bulk.read_accounts(path)
+                    bulk.validate_accounts(accounts, self._application.accounts)
+                except (OSError, ValueError) as error:
+                    # Otherwise, edit the message and run the window again
+                    self.message = f'{error} {self._base_message}'
+                    continue
+                break
+            else:
+                # Exit if the user cancels
+                return
+        # Return the valid accounts
+        return accounts
+
+
+class ExportAccounts(rumps.Window):
+    '''A window that allows the user to export accounts to a file.
+
+    A very basic wrapper around rumps.Window with preset titles, text, 
+    etc. It includes one supplementary method that handles looping of 
+    the rumps.Window.run() method if incorrect input is received.
+
+    Upon valid input, the path to export to will be returned.
+
+    Args:
+        application (multitooner.app.Application object):
+            A reference to the main Application object.
+    '''
+
+    def __init__(self, application):
+        '''Please see help(ExportAccounts) for more info.'''
+
+        # Store parameters and initalize the base message of the window
+        self._application = application
+        self._base_message = (
+            'Enter the path of the .csv or .json file to export to.\n\n'
+            'Note that passwords are exported as plain text.'
+        )
+
+        # Initialize and set up the class
+        super().__init__(ok='Export', cancel='Cancel', dimensions=(295, 24))
+        self.title = 'Export Accounts'
+        self.message = self._base_message
+        self.default_text = '~/accounts.csv'
+        self.icon = None
+
+    def get_input(self):
+        '''Run the window until valid input is received.
+        
+        Continuously run the window until the user either cancels or 
+        enters a valid path.
+        '''
+
+        # Loop continuously until cancelled or valid input is received
+        while True:
+            # Display the window and wait for the user's response
+            response = self.run()
+            if response.clicked:
+                # If the user presses "Export", check the validity of the path
+                path = os.path.expanduser(response.text.strip())
+                if self._is_valid(path):
+                    # If the path is valid, break the loop
+                    break
+                else:
+                    # Otherwise, edit the message and run the window again
+                    self.message = f'Please try again. {self._base_message}'
+                    continue
+            else:
+                # Exit if the user cancels
+                return
+        # Return the user's valid path
+        return path
+
+    def _is_valid(self, path):
+        '''Checks the validity of the user's input.
+        
+        Args:
+            path (str):
+                The path to check the validity of.
+        '''
+
+        return all([
+            os.path.splitext(path)[1].lower() in ('.csv', '.json'),
+            os.path.isdir(os.path.dirname(path) or '.'),
+        ])
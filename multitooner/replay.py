@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.replay module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The replay module for the MultiTooner application. Contains classes for
+recording responses from the invasion tracker and replaying them later,
+so that the invasion pipeline can be tested and benchmarked without the
+Toontown Rewritten API.
+
+Recordings are gzipped JSON lines. Each line holds the time of a poll
+and, only if they changed since the previous poll, the invasion details
+that were returned.
+'''
+
+import gzip
+import json
+import threading
+import time
+
+
+def read_records(path):
+    '''Yields the time and invasion details of each recorded poll.
+
+    Args:
+        path (str):
+            The path to the recording.
+    '''
+
+    details = {}
+    with gzip.open(path, 'rt') as recording:
+        lines = iter(recording)
+        while True:
+            try:
+                line = next(lines)
+            except StopIteration:
+                return
+            except EOFError:
+                # A recording that was never closed ends at its last flush
+                return
+            record = json.loads(line)
+            # Polls that returned the same details only store their time
+            if 'd' in record:
+                details = {
+                    district: tuple(invasion)
+                    for district, invasion in record['d'].items()
+                }
+            yield record['t'], details
+
+
+def replay(path, callback, speed=0, sleep=time.sleep):
+    '''Feeds a recording to a callback, one poll at a time.
+
+    Args:
+        path (str):
+            The path to the recording.
+        callback (function):
+            The function to call with the invasion details of each poll.
+        speed (int or float):
+            How many times faster than real time to replay the polls.
+            Defaults to 0, in which case there is no delay at all.
+        sleep (function):
+            The function used to wait between polls. Defaults to
+            time.sleep.
+    '''
+
+    previous = None
+    for timestamp, details in read_records(path):
+        if speed and previous is not None:
+            sleep(max(timestamp - previous, 0) / speed)
+        previous = timestamp
+        callback(details)
+
+
+class InvasionRecorder:
+    '''Records the responses of an invasion tracker.
+
+    Wraps a tracker, passing its responses through unchanged while also
+    appending them to a recording. The recording is kept open as a
+    single compressed stream and flushed after every poll, so it can be
+    read at any time; call close once recording is done.
+
+    Args:
+        tracker (invasions.InvasionTracker):
+            The tracker to record.
+        path (str):
+            The path to the recording, which is appended to if it
+            already exists.
+    '''
+
+    def __init__(self, tracker, path):
+        '''Please see help(InvasionRecorder) for more info.'''
+
+        self._tracker = tracker
+        self.path = path
+        self._previous = None
+        self._recording = None
+
+    def get_details(self):
+        '''Gets and records the details of each current invasion.'''
+
+        details = self._tracker.get_details()
+        record = {'t': time.time()}
+        if details != self._previous:
+            record['d'] = details
+            self._previous = details
+        if self._recording is None:
+            self._recording = gzip.open(self.path, 'at')
+        self._recording.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self._recording.flush()
+        return details
+
+    def close(self):
+        '''Finishes the recording.'''
+
+        if self._recording is not None:
+            self._recording.close()
+            self._recording = None
+
+
+class ReplayScheduler:
+    '''Replays a recording on a background thread at its recorded pace.
+
+    Each recorded poll is passed to the callback at the time it was 
+    recorded, relative to the first poll and divided by the speed, or 
+    as fast as possible if the speed is 0. The schedule is kept against the time the replay started, so the time 
+    spent in the callback never delays the polls that follow. Once the 
+    recording is exhausted, the thread simply finishes.
+
+    Args:
+        path (str):
+            The path to the recording.
+        callback (function):
+            The function to call with the recorded time and invasion 
+            details of each poll, from the replay's thread.
+        speed (int or float):
+            How many times faster than real time to replay the polls.
+            Defaults to 1. 0 replays them without any delay.
+    '''
+
+    def __init__(self, path, callback, speed=1):
+        '''Please see help(ReplayScheduler) for more info.'''
+
+        # Store parameters
+        self.path = path
+        self.speed = speed
+        self._callback = callback
+
+        # Create the thread that replays the recording
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def finished(self):
+        '''Returns whether or not the replay has finished or stopped.'''
+
+        return self._thread.ident is not None and not self._thread.is_alive()
+
+    def start(self):
+        '''Starts replaying the recording.'''
+
+        self._thread.start()
+
+    def stop(self):
+        '''Stops replaying the recording before the next poll.'''
+
+        self._stopped.set()
+
+    def join(self, timeout=None):
+        '''Waits for the replay to finish.
+
+        Args:
+            timeout (int or float):
+                The maximum number of seconds to wait. Defaults to None, 
+                in which case there is no limit.
+        '''
+
+        self._thread.join(timeout)
+
+    def _run(self):
+        '''Passes each recorded poll to the callback on schedule.'''
+
+        started = time.monotonic()
+        first = None
+        for timestamp, details in read_records(self.path):
+            if first is None:
+                first = timestamp
+            delay = 0
+            if self.speed:
+                due = started + max(timestamp - first, 0) / self.speed
+                delay = max(due - time.monotonic(), 0)
+            if self._stopped.wait(delay):
+                return
+            self._callback(timestamp, details)
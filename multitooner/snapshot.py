@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.snapshot module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The snapshot module for the MultiTooner application. Saves what the
+menu last showed, so that the next launch can show the menu right away
+and only then open the configuration file and check the system.
+'''
+
+import marshal
+import os
+import time
+
+
+# The filename of the snapshot in the Application Support folder
+FILENAME = 'snapshot.bin'
+
+# The version of the snapshot's format, which invalidates older snapshots
+VERSION = 1
+
+
+def save(path, accounts, settings, login, details):
+    '''Saves a snapshot of the rendered state.
+
+    The snapshot is written with marshal, which only needs to handle
+    built-in types and is much faster to read than the configuration.
+    The file is replaced atomically. Passwords are never saved.
+
+    Args:
+        path (str):
+            The full path to the snapshot file.
+        accounts (list):
+            The names of the configured accounts.
+        settings (dict):
+            The value of every setting.
+        login (bool):
+            Whether or not the application runs at login.
+        details (dict):
+            A dictionary of invaded districts and tuples of their
+            invading cog and progress.
+    '''
+
+    state = {
+        'version': VERSION,
+        'time': time.time(),
+        'accounts': list(accounts),
+        'settings': dict(settings),
+        'login': bool(login),
+        'invasions': {
+            district: tuple(invasion)
+            for district, invasion in details.items()
+        },
+    }
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as file:
+        marshal.dump(state, file)
+    os.replace(temporary, path)
+
+
+def load(path):
+    '''Returns the saved snapshot, or None if it can't be used.
+
+    Args:
+        path (str):
+            The full path to the snapshot file.
+    '''
+
+    try:
+        with open(path, 'rb') as file:
+            state = marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(state, dict) or state.get('version') != VERSION:
+        return None
+    return state
+
+
+class ConfigurationSnapshot:
+    '''Stands in for the configuration until it has been opened.
+
+    Only provides the account names and settings, which is all that is
+    needed to show the menu. Anything else, such as reading an account
+    or changing a setting, is passed on to the real configuration, which
+    is opened as soon as it is first needed. Please see
+    help(config.Configuration) for more info.
+
+    Args:
+        state (dict):
+            The snapshot, as returned by load.
+        path (str):
+            The full path to the configuration file.
+        load (function):
+            The function that opens and returns the real configuration.
+            Defaults to None, in which case only the saved state is
+            available.
+    '''
+
+    def __init__(self, state, path, load=None):
+        '''Please see help(ConfigurationSnapshot) for more info.'''
+
+        self._state = state
+        self._path = path
+        self._load = load
+
+    def __getattr__(self, name):
+        '''Passes anything the snapshot can't answer to the real one.'''
+
+        if name.startswith('_') or self._load is None:
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+    def get_setting(self, option):
+        '''Returns the saved value of the specified setting.
+
+        Args:
+            option (str):
+                The name of the setting.
+        '''
+
+        return self._state['settings'][option]
+
+    @property
+    def settings(self):
+        '''Returns a dictionary of every setting and its value.'''
+
+        return dict(self._state['settings'])
+
+    @property
+    def path(self):
+        '''Returns the full path to the configuration file.'''
+
+        return self._path
+
+    @property
+    def accounts(self):
+        '''Returns a list of the saved account names.'''
+
+        return list(self._state['accounts'])
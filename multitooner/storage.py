@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.storage module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The storage module for the MultiTooner application. Contains the
+backends that the configuration uses to read and write its settings and
+accounts.
+'''
+
+import configparser
+import os
+import sqlite3
+
+
+def open_storage(path):
+    '''Opens the appropriate storage backend for the specified file.
+
+    The backend is chosen by the extension of the file: ".ini" files
+    use the INI backend, and anything else uses the SQLite backend. An
+    SQLite file will automatically migrate an INI file with the same
+    name if one exists.
+
+    Args:
+        path (str):
+            The full path to the configuration file.
+    '''
+
+    root, extension = os.path.splitext(path)
+    if extension == '.ini':
+        return IniStorage(path)
+    return SQLiteStorage(path, legacy_path=f'{root}.ini')
+
+
+class Storage:
+    '''Base class for configuration storage backends.
+
+    Settings are stored as strings, and accounts are stored as a name
+    with a corresponding username and password. Changes are not
+    guaranteed to be persisted until the save method is called.
+    '''
+
+    def get_settings(self):
+        '''Returns a dictionary of every stored setting.'''
+
+        raise NotImplementedError
+
+    def set_setting(self, option, value):
+        '''Sets the value of a setting.
+
+        Args:
+            option (str):
+                The name of the setting.
+            value (str):
+                The value of the setting.
+        '''
+
+        raise NotImplementedError
+
+    def get_accounts(self):
+        '''Returns a list of stored account names in insertion order.'''
+
+        raise NotImplementedError
+
+    def get_account(self, name):
+        '''Returns the username and password of the specified account.
+
+        Args:
+            name (str):
+                The name of the account.
+        '''
+
+        raise NotImplementedError
+
+    def put_account(self, name, username, password):
+        '''Adds an account, or replaces it if it already exists.
+
+        Args:
+            name (str):
+                The name of the account.
+            username (str):
+                The username of the account.
+            password (str):
+                The password of the account.
+        '''
+
+        raise NotImplementedError
+
+    def delete_account(self, name):
+        '''Deletes the specified account.
+
+        Args:
+            name (str):
+                The name of the account.
+        '''
+
+        raise NotImplementedError
+
+    def save(self):
+        '''Persists any changes that have not been saved yet.'''
+
+        raise NotImplementedError
+
+    def reload(self):
+        '''Discards anything cached in memory so it is read again.'''
+
+        raise NotImplementedError
+
+    def changed_elsewhere(self):
+        '''Returns whether something else changed the file.
+
+        Only changes made since the file was last read, written or 
+        checked are reported, so the backend's own saves never are.
+        '''
+
+        raise NotImplementedError
+
+
+class IniStorage(Storage):
+    '''Stores the configuration in an INI file.
+
+    Settings are stored in the DEFAULT section and each account is
+    stored in a section of its own. The whole file is read on load and
+    written on save, so this backend is best suited to configurations
+    that are edited by hand.
+
+    Args:
+        path (str):
+            The full path to the INI file.
+    '''
+
+    def __init__(self, path):
+        '''Please see help(IniStorage) for more info.'''
+
+        self.path = path
+        self.reload()
+
+    def get_settings(self):
+        '''Returns a dictionary of every stored setting.'''
+
+        return dict(self._parser.defaults())
+
+    def set_setting(self, option, value):
+        '''Please see help(Storage.set_setting) for more info.'''
+
+        self._parser.set('DEFAULT', option, value)
+        self._dirty = True
+
+    def get_accounts(self):
+        '''Returns a list of stored account names in insertion order.'''
+
+        return self._parser.sections()
+
+    def get_account(self, name):
+        '''Please see help(Storage.get_account) for more info.'''
+
+        section = self._parser[name]
+        return section['username'], section['password']
+
+    def put_account(self, name, username, password):
+        '''Please see help(Storage.put_account) for more info.'''
+
+        if not self._parser.has_section(name):
+            self._parser.add_section(name)
+        self._parser.set(name, 'username', username)
+        self._parser.set(name, 'password', password)
+        self._dirty = True
+
+    def delete_account(self, name):
+        '''Please see help(Storage.delete_account) for more info.'''
+
+        self._parser.remove_section(name)
+        self._dirty = True
+
+    def save(self):
+        '''Writes the whole INI file if anything has changed.'''
+
+        if not self._dirty:
+            return
+        with open(self.path, 'w') as config:
+            self._parser.write(config)
+        self._dirty = False
+        self._signature = self._get_signature()
+
+    def reload(self):
+        '''Reads the INI file again, whether it exists or not.'''
+
+        self._parser = configparser.ConfigParser(interpolation=None)
+        self._signature = self._get_signature()
+        self._parser.read(self.path)
+        self._dirty = False
+
+    def changed_elsewhere(self):
+        '''Please see help(Storage.changed_elsewhere) for more info.'''
+
+        signature = self._get_signature()
+        changed = signature != self._signature
+        self._signature = signature
+        return changed
+
+    def _get_signature(self):
+        '''Returns the modification time and size of the file.'''
+
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+
+class SQLiteStorage(Storage):
+    '''Stores the configuration in an SQLite database.
+
+    Each setting and each account is a separate row, so a change only
+    writes the record that was touched. Nothing is read until it is
+    first needed: account names are cached on first access, and
+    usernames and passwords are only read when an account is requested.
+
+    If the database does not exist yet but an INI configuration does,
+    the INI configuration is imported and then renamed so that it is
+    only ever migrated once.
+
+    Args:
+        path (str):
+            The full path to the database file.
+        legacy_path (str):
+            The full path to an INI configuration to migrate. Defaults
+            to None.
+    '''
+
+    def __init__(self, path, legacy_path=None):
+        '''Please see help(SQLiteStorage) for more info.'''
+
+        # Store parameters
+        self.path = path
+        self._legacy_path = legacy_path
+
+        # The connection and caches are created lazily
+        self._connection = None
+        self._settings = None
+        self._accounts = None
+        self._data_version = None
+
+    @property
+    def connection(self):
+        '''Returns the database connection, opening it if necessary.'''
+
+        if self._connection is None:
+            if (
+                self._legacy_path is not None
+                and not os.path.exists(self.path)
+                and os.path.exists(self._legacy_path)
+            ):
+                self._migrate()
+            self._connection = sqlite3.connect(self.path)
+            _create_tables(self._connection)
+            self._data_version = self._get_data_version()
+        return self._connection
+
+    def get_settings(self):
+        '''Returns a dictionary of every stored setting.'''
+
+        if self._settings is None:
+            rows = self.connection.execute('SELECT option, value FROM settings')
+            self._settings = dict(rows)
+        return dict(self._settings)
+
+    def set_setting(self, option, value):
+        '''Please see help(Storage.set_setting) for more info.'''
+
+        self.connection.execute(
+            'INSERT OR REPLACE INTO settings (option, value) VALUES (?, ?)',
+            (option, value),
+        )
+        if self._settings is not None:
+            self._settings[option] = value
+
+    def get_accounts(self):
+        '''Returns a list of stored account names in insertion order.'''
+
+        if self._accounts is None:
+            rows = self.connection.execute(
+                'SELECT name FROM accounts ORDER BY rowid'
+            )
+            self._accounts = [name for name, in rows]
+        return list(self._accounts)
+
+    def get_account(self, name):
+        '''Please see help(Storage.get_account) for more info.'''
+
+        row = self.connection.execute(
+            'SELECT username, password FROM accounts WHERE name = ?',
+            (name,),
+        ).fetchone()
+        if row is None:
+            raise KeyError(name)
+        return row
+
+    def put_account(self, name, username, password):
+        '''Please see help(Storage.put_account) for more info.'''
+
+        cursor = self.connection.execute(
+            'UPDATE accounts SET username = ?, password = ? WHERE name = ?',
+            (username, password, name),
+        )
+        if not cursor.rowcount:
+            self.connection.execute(
+                'INSERT INTO accounts (name, username, password) '
+                'VALUES (?, ?, ?)',
+                (name, username, password),
+            )
+            if self._accounts is not None:
+                self._accounts.append(name)
+
+    def delete_account(self, name):
+        '''Please see help(Storage.delete_account) for more info.'''
+
+        self.connection.execute('DELETE FROM accounts WHERE name = ?', (name,))
+        if self._accounts is not None and name in self._accounts:
+            self._accounts.remove(name)
+
+    def save(self):
+        '''Commits the changes made since the last save.'''
+
+        if self._connection is not None and self._connection.in_transaction:
+            self._connection.commit()
+
+    def reload(self):
+        '''Discards the cached settings and account names.'''
+
+        if self._connection is not None and self._connection.in_transaction:
+            self._connection.rollback()
+        self._settings = None
+        self._accounts = None
+
+    def changed_elsewhere(self):
+        '''Please see help(Storage.changed_elsewhere) for more info.
+
+        SQLite's data version only changes when another connection 
+        commits, so the database's own saves are ignored for free.
+        '''
+
+        version = self._get_data_version()
+        changed = version != self._data_version
+        self._data_version = version
+        return changed
+
+    def _get_data_version(self):
+        '''Returns the data version of the database.'''
+
+        return self.connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def _migrate(self):
+        '''Imports the legacy INI configuration into the database.
+
+        The configuration is imported into a temporary database that 
+        only replaces the real one once the whole import succeeded, so 
+        a failed import is simply tried again the next time.
+        '''
+
+        temporary = f'{self.path}.migrating'
+        try:
+            os.remove(temporary)
+        except FileNotFoundError:
+            pass
+        try:
+            legacy = IniStorage(self._legacy_path)
+            connection = sqlite3.connect(temporary)
+            try:
+                with connection:
+                    _create_tables(connection)
+                    connection.executemany(
+                        'INSERT INTO settings (option, value) VALUES (?, ?)',
+                        legacy.get_settings().items(),
+                    )
+                    connection.executemany(
+                        'INSERT INTO accounts (name, username, password) '
+                        'VALUES (?, ?, ?)',
+                        [
+                            (name, *legacy.get_account(name))
+                            for name in legacy.get_accounts()
+                        ],
+                    )
+            finally:
+                connection.close()
+            os.replace(temporary, self.path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        # Keep the legacy configuration as a backup but never migrate it again
+        os.replace(self._legacy_path, f'{self._legacy_path}.migrated')
+
+
+def _create_tables(connection):
+    '''Creates the tables of the configuration if they don't exist.
+
+    Args:
+        connection (sqlite3.Connection):
+            The connection to the database.
+    '''
+
+    connection.executescript('''
+        CREATE TABLE IF NOT EXISTS settings (
+            option TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS accounts (
+            name TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            password TEXT NOT NULL
+        );
+    ''')
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.support module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The support module for the MultiTooner application. Resolves paths in
+the application's Application Support folder without needing the menu
+bar application (or rumps) to be loaded, e.g. from the command line.
+'''
+
+import os
+
+
+# The MultiTooner folder inside the user's Application Support folder
+APPLICATION_SUPPORT = os.path.join(
+    os.path.expanduser('~'),
+    'Library',
+    'Application Support',
+    'MultiTooner',
+)
+
+
+def application_support(item=None):
+    '''Returns the path to an item in the Application Support folder.
+
+    The folder is created if it does not exist yet.
+
+    Args:
+        item (str):
+            The name of the file. Defaults to None, in which case the
+            path to the folder itself is returned.
+    '''
+
+    os.makedirs(APPLICATION_SUPPORT, exist_ok=True)
+    if item is None:
+        return APPLICATION_SUPPORT
+    return os.path.join(APPLICATION_SUPPORT, item)
+
+
+class SupportFolder:
+    '''Stands in for the main Application object when resolving paths.
+
+    Objects such as config.Configuration only need to look up the path
+    of a file in the Application Support folder, which this class
+    provides in the same way as the main Application object.
+    '''
+
+    def __getitem__(self, item):
+        '''Returns the full path to the item in the Application Support folder.
+
+        Args:
+            item (str):
+                The name of the file.
+        '''
+
+        return application_support(item)
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.watchdog module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The watchdog module for the MultiTooner application. Contains a
+watchdog that notices when the main thread stops responding.
+'''
+
+import logging
+import logging.handlers
+import sys
+import threading
+import time
+import traceback
+
+import events
+
+
+class StallWatchdog:
+    '''Records every stall of the main thread above a threshold.
+
+    A background thread regularly posts a ping to the main thread (e.g.
+    with AppHelper.callAfter) and measures how long it takes to run. If
+    the ping is still waiting after the threshold, the main thread's
+    stack is captured while it is still stuck. Once the ping runs, the
+    stall is written to a rolling log along with its duration and the
+    captured stack. Since the ping is posted rather than scheduled, it
+    still runs while a menu is open or a window is modal.
+
+    Only one ping is ever waiting, and the next one is only sent a while
+    after the previous one was answered, so the watchdog barely wakes
+    the main thread (or the CPU) of an application that runs for weeks.
+
+    Args:
+        path (str):
+            The full path to the rolling log file.
+        post (function):
+            The function that runs a function on the main thread.
+        threshold (int or float):
+            The number of seconds a ping may wait before it counts as a
+            stall. Defaults to 0.5.
+        interval (int or float):
+            The number of seconds between a ping being answered and the
+            next one being sent, which is never less than half of the
+            threshold. Defaults to 1.
+    '''
+
+    def __init__(self, path, post, threshold=0.5, interval=1):
+        '''Please see help(StallWatchdog) for more info.'''
+
+        # Store parameters
+        self.threshold = threshold
+        self._post = post
+        self._interval = interval
+
+        # Write stalls to a log file that rolls over at one megabyte
+        self._logger = logging.getLogger('multitooner.watchdog')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        if not self._logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(
+                path,
+                maxBytes=2**20,
+                backupCount=3,
+            )
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self._logger.addHandler(handler)
+
+        # Keep a summary of the stalls so far
+        self.count = 0
+        self.longest = 0
+        self.total = 0
+
+        # Note the main thread and when the last ping was answered
+        self._main_thread = threading.main_thread().ident
+        self._answered_at = None
+        self._answered = threading.Event()
+        self._stack = None
+
+        # Create the thread that pings the main thread
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def summary(self):
+        '''Returns a short summary of the stalls so far.'''
+
+        return f'Stalls: {self.count} (longest {self.longest:.1f} s)'
+
+    def start(self):
+        '''Starts pinging the main thread.'''
+
+        self._thread.start()
+
+    def stop(self):
+        '''Stops pinging the main thread.'''
+
+        self._stopped.set()
+        self._answered.set()
+
+    def _pong(self):
+        '''Notes when a ping was answered, on the main thread.'''
+
+        self._answered_at = time.monotonic()
+        self._answered.set()
+
+    def _run(self):
+        '''Pings the main thread until stopped.'''
+
+        while not self._stopped.is_set():
+            self._answered.clear()
+            sent_at = time.monotonic()
+            self._post(self._pong)
+            if not self._answered.wait(self.threshold):
+                # Capture the main thread's stack while it is still stuck
+                self._stack = self._capture_stack()
+                self._answered.wait()
+                if self._stopped.is_set():
+                    return
+                self._record(self._answered_at - sent_at)
+            self._stopped.wait(max(self._interval, self.threshold / 2))
+
+    def _capture_stack(self):
+        '''Returns the formatted stack of the main thread.'''
+
+        frame = sys._current_frames().get(self._main_thread)
+        if frame is None:
+            return ''
+        return ''.join(traceback.format_stack(frame))
+
+    def _record(self, duration):
+        '''Records a stall in the summary and the log.
+
+        Args:
+            duration (float):
+                The duration of the stall in seconds.
+        '''
+
+        self.count += 1
+        self.total += duration
+        self.longest = max(self.longest, duration)
+        self._logger.info(
+            'Main thread stalled for %.3f s:\n%s',
+            duration,
+            self._stack,
+        )
+        events.warning('stall', seconds=round(duration, 3))
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+'''
+multitooner.watcher module
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The watcher module for the MultiTooner application. Contains a class
+that watches a file for changes made outside of the application.
+'''
+
+import hashlib
+import os
+import select
+import threading
+
+
+class FileWatcher:
+    '''Watches a file and calls back when its contents change.
+
+    On macOS, the file is watched with kqueue so that changes are
+    noticed as soon as they happen; elsewhere, or if kqueue cannot be
+    used, the file is polled with os.stat instead. Either way, the file
+    is only hashed when its modification time or size has changed, and
+    the callback is only called when the hash has changed too.
+
+    The file is first hashed on the watcher's own thread once it is
+    started, so changes made before then aren't reported. The callback
+    is called from that thread too, so it should hand any work that
+    touches the menu off to the main thread.
+
+    Args:
+        path (str):
+            The full path to the file to watch.
+        callback (function):
+            The function to call, without arguments, when the file
+            changes.
+        interval (int or float):
+            The maximum number of seconds between checks of the file.
+            Defaults to 2.
+    '''
+
+    def __init__(self, path, callback, interval=2):
+        '''Please see help(FileWatcher) for more info.'''
+
+        # Store parameters
+        self.path = path
+        self._callback = callback
+        self._interval = interval
+
+        # The current state of the file is read once the thread starts
+        self._signature = None
+        self._hash = None
+
+        # Create the thread that watches the file
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        '''Starts watching the file.'''
+
+        self._thread.start()
+
+    def stop(self):
+        '''Stops watching the file.'''
+
+        self._stopped.set()
+
+    def _run(self):
+        '''Waits for changes to the file until stopped.'''
+
+        # Remember the current state of the file so it isn't reported, off
+        # the thread that started the watcher since hashing may take a while
+        self._signature = self._get_signature()
+        self._hash = self._get_hash()
+
+        # Use kqueue if it is available, otherwise fall back to polling
+        kqueue = select.kqueue() if hasattr(select, 'kqueue') else None
+        descriptor = None
+        try:
+            while not self._stopped.is_set():
+                if kqueue is None:
+                    self._stopped.wait(self._interval)
+                else:
+                    # The file may have been replaced, so reopen it each time
+                    descriptor = self._wait_for_event(kqueue, descriptor)
+                self._check()
+        finally:
+            if descriptor is not None:
+                os.close(descriptor)
+            if kqueue is not None:
+                kqueue.close()
+
+    def _wait_for_event(self, kqueue, descriptor):
+        '''Waits for a kqueue event on the file or for the interval to pass.
+
+        Returns the descriptor of the watched file, or None if the file
+        does not exist, in which case the interval is simply waited out.
+
+        Args:
+            kqueue (select.kqueue):
+                The kqueue to wait on.
+            descriptor (int or None):
+                The descriptor of the file from the previous wait.
+        '''
+
+        # Open the file if necessary, which fails if it doesn't exist
+        if descriptor is None:
+            try:
+                descriptor = os.open(
+                    self.path,
+                    getattr(os, 'O_EVTONLY', os.O_RDONLY),
+                )
+            except OSError:
+                self._stopped.wait(self._interval)
+                return None
+
+        # Wait for the file to be written, deleted or replaced
+        event = select.kevent(
+            descriptor,
+            filter=select.KQ_FILTER_VNODE,
+            flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+            fflags=(
+                select.KQ_NOTE_WRITE
+                | select.KQ_NOTE_EXTEND
+                | select.KQ_NOTE_ATTRIB
+                | select.KQ_NOTE_DELETE
+                | select.KQ_NOTE_RENAME
+            ),
+        )
+        events = kqueue.control([event], 1, self._interval)
+
+        # Stop watching the old file if it was deleted or replaced
+        gone = select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME
+        if any(e.fflags & gone for e in events):
+            os.close(descriptor)
+            return None
+        return descriptor
+
+    def _check(self):
+        '''Calls the callback if the contents of the file have changed.'''
+
+        # Only hash the file if its modification time or size changed
+        signature = self._get_signature()
+        if signature == self._signature:
+            return
+        self._signature = signature
+
+        # Only call back if the contents of the file actually changed
+        digest = self._get_hash()
+        if digest == self._hash:
+            return
+        self._hash = digest
+        self._callback()
+
+    def _get_signature(self):
+        '''Returns the modification time and size of the file.'''
+
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _get_hash(self):
+        '''Returns a hash of the contents of the file.'''
+
+        try:
+            with open(self.path, 'rb') as file:
+                return hashlib.sha1(file.read()).hexdigest()
+        except OSError:
+            return None
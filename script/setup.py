@@ -24,7 +24,26 @@ APPLICATION_PATH = os.path.join(PROJECT_FOLDER, 'app.py')
 PREFERENCES_PATH = os.path.join(PROJECT_FOLDER, 'preferences.py')
 AUTHENTICATE_PATH = os.path.join(PROJECT_FOLDER, 'authenticate.py')
 CONFIG_PATH = os.path.join(PROJECT_FOLDER, 'config.py')
+STORAGE_PATH = os.path.join(PROJECT_FOLDER, 'storage.py')
 LOGIN_PATH = os.path.join(PROJECT_FOLDER, 'login.py')
+SUPPORT_PATH = os.path.join(PROJECT_FOLDER, 'support.py')
+BULK_PATH = os.path.join(PROJECT_FOLDER, 'bulk.py')
+WATCHER_PATH = os.path.join(PROJECT_FOLDER, 'watcher.py')
+LAUNCHER_PATH = os.path.join(PROJECT_FOLDER, 'launcher.py')
+ADMISSION_PATH = os.path.join(PROJECT_FOLDER, 'admission.py')
+DIAGNOSTICS_PATH = os.path.join(PROJECT_FOLDER, 'diagnostics.py')
+WATCHDOG_PATH = os.path.join(PROJECT_FOLDER, 'watchdog.py')
+REPLAY_PATH = os.path.join(PROJECT_FOLDER, 'replay.py')
+HEALTH_PATH = os.path.join(PROJECT_FOLDER, 'health.py')
+EVENTS_PATH = os.path.join(PROJECT_FOLDER, 'events.py')
+INSTALL_PATH = os.path.join(PROJECT_FOLDER, 'install.py')
+INTEGRITY_PATH = os.path.join(PROJECT_FOLDER, 'integrity.py')
+INSTANCE_PATH = os.path.join(PROJECT_FOLDER, 'instance.py')
+CONTROL_PATH = os.path.join(PROJECT_FOLDER, 'control.py')
+BREAKER_PATH = os.path.join(PROJECT_FOLDER, 'breaker.py')
+ESTIMATOR_PATH = os.path.join(PROJECT_FOLDER, 'estimator.py')
+SNAPSHOT_PATH = os.path.join(PROJECT_FOLDER, 'snapshot.py')
+INVASIONS_PATH = os.path.join(PROJECT_FOLDER, 'invasions.py')
 ICON_PATH = os.path.join(DATA_FOLDER, 'icon.icns')
 MENUBAR_ICON_PATH = os.path.join(DATA_FOLDER, 'icon-desaturated.icns')
 
@@ -34,7 +53,26 @@ DATA_FILES = [
     PREFERENCES_PATH,
     AUTHENTICATE_PATH,
     CONFIG_PATH,
+    STORAGE_PATH,
     LOGIN_PATH,
+    INVASIONS_PATH,
+    SUPPORT_PATH,
+    BULK_PATH,
+    WATCHER_PATH,
+    LAUNCHER_PATH,
+    ADMISSION_PATH,
+    DIAGNOSTICS_PATH,
+    WATCHDOG_PATH,
+    REPLAY_PATH,
+    HEALTH_PATH,
+    EVENTS_PATH,
+    INSTALL_PATH,
+    INTEGRITY_PATH,
+    INSTANCE_PATH,
+    CONTROL_PATH,
+    BREAKER_PATH,
+    ESTIMATOR_PATH,
+    SNAPSHOT_PATH,
     ICON_PATH,
     MENUBAR_ICON_PATH,
 ]
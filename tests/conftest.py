@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The application's modules import each other by their bare names
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'multitooner'),
+)
@@ -3,3 +3,839 @@ from multitooner import __version__
 
 def test_version():
     assert __version__ == '0.1.0'
+
+
+def test_sqlite_storage_migrates_ini(tmp_path):
+    from multitooner import storage
+
+    legacy = storage.IniStorage(str(tmp_path / 'config.ini'))
+    legacy.set_setting('interval', '30')
+    legacy.put_account('main', 'user', 'pass')
+    legacy.save()
+
+    database = storage.open_storage(str(tmp_path / 'config.db'))
+    assert database.get_settings() == {'interval': '30'}
+    assert database.get_accounts() == ['main']
+    assert tuple(database.get_account('main')) == ('user', 'pass')
+    assert not (tmp_path / 'config.ini').exists()
+
+    database.put_account('alt', 'user2', 'pass2')
+    database.delete_account('main')
+    database.save()
+    assert storage.open_storage(str(tmp_path / 'config.db')).get_accounts() == ['alt']
+
+
+def test_bulk_accounts_round_trip(tmp_path):
+    import pytest
+    from multitooner import bulk
+
+    accounts = [('main', 'user', 'pass'), ('alt', 'user2', 'pass2')]
+    for name in ('accounts.csv', 'accounts.json'):
+        bulk.write_accounts(str(tmp_path / name), accounts)
+        assert bulk.read_accounts(str(tmp_path / name)) == accounts
+        assert (tmp_path / name).stat().st_mode & 0o777 == 0o600
+
+    # Spreadsheet applications start CSV files with a byte order mark
+    (tmp_path / 'excel.csv').write_bytes(
+        b'\xef\xbb\xbfname,username,password\r\nmain,user,pass\r\n'
+    )
+    assert bulk.read_accounts(str(tmp_path / 'excel.csv')) == accounts[:1]
+
+    # Fields too large for the csv module are reported like other problems
+    (tmp_path / 'huge.csv').write_text(
+        'name,username,password\nalt,a,b\nmain,user,"' + 'x' * 200000 + '"\n'
+    )
+    with pytest.raises(ValueError, match='Account 2 could not be read'):
+        bulk.read_accounts(str(tmp_path / 'huge.csv'))
+
+    bulk.validate_accounts(accounts, existing=['other'])
+    with pytest.raises(ValueError):
+        bulk.validate_accounts(accounts + [('main', 'a', 'b')], existing=[])
+    with pytest.raises(ValueError):
+        bulk.validate_accounts(accounts, existing=['alt'])
+
+
+def test_replay_round_trip(tmp_path):
+    from multitooner import replay
+
+    class Tracker:
+        responses = [
+            {'Boingy Acres': ('Flunky', '10/1000')},
+            {'Boingy Acres': ('Flunky', '10/1000')},
+            {},
+        ]
+
+        def get_details(self):
+            return self.responses.pop(0)
+
+    path = str(tmp_path / 'invasions.jsonl.gz')
+    recorder = replay.InvasionRecorder(Tracker(), path)
+    for _ in range(3):
+        recorder.get_details()
+
+    # Every poll can be read back before the recording is closed
+    assert len(list(replay.read_records(path))) == 3
+    recorder.close()
+
+    replayed = []
+    replay.replay(path, replayed.append)
+    assert replayed == [
+        {'Boingy Acres': ('Flunky', '10/1000')},
+        {'Boingy Acres': ('Flunky', '10/1000')},
+        {},
+    ]
+
+    # The scheduler replays every poll with its recorded time
+    for speed in (100, 0):
+        scheduled = []
+        scheduler = replay.ReplayScheduler(
+            path,
+            lambda timestamp, details: scheduled.append((timestamp, details)),
+            speed=speed,
+        )
+        scheduler.start()
+        scheduler.join(5)
+        assert scheduler.finished
+        assert [details for _, details in scheduled] == replayed
+        assert [timestamp for timestamp, _ in scheduled] == sorted(
+            timestamp for timestamp, _ in scheduled
+        )
+
+
+def test_replay_recording_is_compact(tmp_path):
+    import json
+    import pytest
+    import main
+    import replay
+
+    class Tracker:
+        polls = 0
+
+        def get_details(self):
+            self.polls += 1
+            return {'Boingy Acres': ('Flunky', f'{self.polls}/1000')}
+
+    path = str(tmp_path / 'invasions.jsonl.gz')
+    recorder = replay.InvasionRecorder(Tracker(), path)
+    raw = 0
+    for _ in range(1000):
+        details = recorder.get_details()
+        raw += len(json.dumps({'t': 0.0, 'd': details})) + 1
+    recorder.close()
+    assert (tmp_path / 'invasions.jsonl.gz').stat().st_size < raw
+    assert len(list(replay.read_records(path))) == 1000
+
+    assert main.parse_arguments(['--speed', '0']).speed == 0
+    with pytest.raises(SystemExit):
+        main.parse_arguments(['--speed', '-1'])
+
+
+def test_circuit_breaker_opens_and_recovers(monkeypatch):
+    import pytest
+    from multitooner import breaker
+
+    now = [0.0]
+    monkeypatch.setattr(breaker.time, 'monotonic', lambda: now[0])
+    states = []
+    circuit = breaker.CircuitBreaker(
+        threshold=2,
+        base_delay=10,
+        jitter=0,
+        on_change=states.append,
+    )
+
+    def fail():
+        raise OSError('down')
+
+    for _ in range(2):
+        with pytest.raises(OSError):
+            circuit.call(fail)
+    assert circuit.state == breaker.OPEN
+    with pytest.raises(breaker.CircuitOpenError):
+        circuit.call(lambda: 'skipped')
+
+    # A call that was already running when the circuit opened doesn't
+    # count as another trip or push the next trial back
+    now[0] = 5
+    circuit._record_failure()
+    assert circuit.retry_after == 5
+
+    # A failed trial reopens the circuit for twice as long
+    now[0] = 10
+    with pytest.raises(OSError):
+        circuit.call(fail)
+    now[0] = 29
+    assert not circuit.available
+    now[0] = 30
+    assert circuit.call(lambda: 'ok') == 'ok'
+    assert states == ['open', 'half-open', 'open', 'half-open', 'closed']
+
+
+def test_invasion_estimator_predicts_end():
+    import pytest
+    from multitooner import estimator
+
+    predictor = estimator.InvasionEstimator(min_samples=3)
+    for poll in range(3):
+        ends = predictor.update(
+            {
+                'Boingy Acres': ('Flunky', f'{1000 + poll * 100}/4000'),
+                'Gulp Gulch': ('Yesman', 'Unknown'),
+            },
+            now=60.0 * poll,
+        )
+    assert ends['Boingy Acres'] == pytest.approx(120 + 2800 * 0.6)
+    assert ends['Gulp Gulch'] is None
+
+    # A different cog starts a new series
+    ends = predictor.update({'Boingy Acres': ('Yesman', '0/4000')}, now=180)
+    assert ends == {'Boingy Acres': None}
+
+
+def test_snapshot_round_trip(tmp_path):
+    from multitooner import snapshot
+
+    path = str(tmp_path / snapshot.FILENAME)
+    assert snapshot.load(path) is None
+    snapshot.save(
+        path,
+        accounts=['main', 'alt'],
+        settings={'interval': 60, 'login': 'launchagent'},
+        login=True,
+        details={'Boingy Acres': ('Flunky', '10/1000')},
+    )
+
+    state = snapshot.load(path)
+    assert state['login'] is True
+    assert state['invasions'] == {'Boingy Acres': ('Flunky', '10/1000')}
+    provisional = snapshot.ConfigurationSnapshot(state, 'config.db')
+    assert provisional.accounts == ['main', 'alt']
+    assert provisional.get_setting('interval') == 60
+
+
+def test_invasions_menu_coalesces_updates(monkeypatch):
+    import pytest
+    pytest.importorskip('rumps')
+    import rumps
+    import invasions
+
+    now = [100.0]
+    monkeypatch.setattr(invasions.time, 'monotonic', lambda: now[0])
+    menu = invasions.InvasionsMenu(rumps.MenuItem('Current Invasions'))
+    redraws = []
+    original = menu._redraw
+    monkeypatch.setattr(menu, '_redraw', lambda: (
+        redraws.append(menu._pending), original(),
+    ))
+
+    # The first update redraws right away, the rest wait for the throttle
+    for progress in ('1/100', '2/100', '3/100'):
+        menu.update({'Boingy Acres': ('Flunky', progress)})
+        menu._flush(None)
+        now[0] += 1
+    assert len(redraws) == 1
+
+    now[0] = 105
+    menu._flush(None)
+    assert len(redraws) == 2
+    assert redraws[-1][0] == {'Boingy Acres': ('Flunky', '3/100')}
+
+
+def test_sqlite_storage_retries_failed_migration(tmp_path):
+    import configparser
+    import pytest
+    from multitooner import storage
+
+    (tmp_path / 'config.ini').write_text('not an ini file\n')
+    with pytest.raises(configparser.Error):
+        storage.open_storage(str(tmp_path / 'config.db')).get_accounts()
+    assert not (tmp_path / 'config.db').exists()
+
+    (tmp_path / 'config.ini').write_text('[main]\nusername = u\npassword = p\n')
+    database = storage.open_storage(str(tmp_path / 'config.db'))
+    assert database.get_accounts() == ['main']
+
+
+def test_config_keeps_last_valid_setting(tmp_path):
+    import config
+
+    folder = {config.FILENAME: str(tmp_path / config.FILENAME)}
+    configuration = config.Configuration(folder, config.FILENAME)
+    assert not configuration.changed_elsewhere()
+    configuration.set_setting('interval', 30)
+    assert not configuration.changed_elsewhere()
+
+    # Edit the database from another connection, as another process would
+    import sqlite3
+    with sqlite3.connect(configuration.path) as other:
+        other.execute(
+            "UPDATE settings SET value = 'abc' WHERE option = 'interval'"
+        )
+        other.execute(
+            "UPDATE settings SET value = 'loud' WHERE option = 'log_level'"
+        )
+    other.close()
+    assert configuration.changed_elsewhere()
+    changes = configuration.reload()
+    assert changes.settings == {}
+    assert configuration.get_setting('interval') == 30
+    assert configuration.get_setting('log_level') == 'INFO'
+
+
+def test_file_watcher_reports_changed_contents(tmp_path):
+    import threading
+    import watcher
+
+    path = tmp_path / 'config.ini'
+    path.write_text('a')
+    changed = threading.Event()
+    file_watcher = watcher.FileWatcher(str(path), changed.set, interval=0.05)
+    # The file is only hashed by the watcher's own thread
+    assert file_watcher._hash is None
+    file_watcher.start()
+    try:
+        # Touching the file without changing its contents is ignored
+        path.write_text('a')
+        assert not changed.wait(0.3)
+        path.write_text('b')
+        assert changed.wait(2)
+    finally:
+        file_watcher.stop()
+
+
+def test_login_backends(tmp_path, monkeypatch):
+    import plistlib
+    import login
+
+    monkeypatch.setattr(login, 'get_application_path', lambda: '/A.app')
+    assert isinstance(login.get_backend('memory'), login.MemoryBackend)
+    assert isinstance(login.get_backend('bogus'), login.LaunchAgentBackend)
+
+    # Enabling the LaunchAgent removes the login item of older versions
+    legacy = login.MemoryBackend(enabled=True)
+    backend = login.LaunchAgentBackend(str(tmp_path), legacy=legacy)
+    assert not backend.is_enabled()
+    backend.enable()
+    assert backend.is_enabled() and not legacy.is_enabled()
+    with open(backend.path, 'rb') as file:
+        assert plistlib.load(file)['RunAtLoad']
+    backend.disable()
+    assert not backend.is_enabled()
+
+    # Upgrading migrates the login item, but only once
+    legacy.enable()
+    assert backend.migrate()
+    assert backend.is_enabled() and not legacy.is_enabled()
+    assert not backend.migrate()
+
+
+def test_stall_watchdog_measures_posted_pings(tmp_path):
+    import threading
+    import time
+    import watchdog
+
+    # Answer the first ping late, as if the main thread were stuck
+    delays = [0.4]
+    posts = []
+
+    def post(function):
+        posts.append(time.monotonic())
+        delay = delays.pop() if delays else 0
+        threading.Timer(delay, function).start()
+
+    stalls = watchdog.StallWatchdog(
+        str(tmp_path / 'stalls.log'),
+        post=post,
+        threshold=0.1,
+        interval=0.02,
+    )
+    stalls.start()
+    try:
+        deadline = time.monotonic() + 3
+        while not stalls.count and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.2)
+    finally:
+        stalls.stop()
+    assert stalls.count == 1
+    assert 0.3 < stalls.longest < 1
+
+    # Pings are never sent faster than every half of the threshold
+    gaps = [after - before for before, after in zip(posts, posts[1:])]
+    assert gaps and min(gaps) >= 0.05
+
+
+def test_events_dump_swallowed_callback_errors(tmp_path, monkeypatch):
+    import logging
+    import pytest
+    import events
+
+    class Directory:
+        def __getitem__(self, filename):
+            return str(tmp_path / filename)
+
+    events.configure(str(tmp_path / 'multitooner.log'), level='bogus')
+    try:
+        assert events.logger.level == logging.INFO
+        monkeypatch.setattr(events, '_crash_directory', Directory())
+
+        @events.dump_on_error
+        def callback(sender):
+            raise RuntimeError('boom')
+
+        @events.dump_on_error
+        def outer(sender):
+            callback(sender)
+
+        with pytest.raises(RuntimeError):
+            outer(None)
+    finally:
+        events.shutdown()
+    crashes = list(tmp_path.glob('crash-*.log'))
+    assert len(crashes) == 1
+    assert 'events.invalid_level' in crashes[0].read_text()
+    assert 'boom' in crashes[0].read_text()
+
+
+def test_instance_lock_and_handoff(tmp_path):
+    import queue
+    import socket
+    import instance
+
+    # Only one instance may hold the lock at a time
+    first = instance.InstanceLock(str(tmp_path / instance.LOCK_FILENAME))
+    second = instance.InstanceLock(str(tmp_path / instance.LOCK_FILENAME))
+    assert first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+    # Intents are validated before being handed to the running instance
+    path = str(tmp_path / instance.SOCKET_FILENAME)
+    intents = queue.Queue()
+    server = instance.InstanceServer(path, intents.put)
+    server.start()
+    try:
+        intent = {'command': 'launch', 'accounts': ['main'], 'event': 'x'}
+        assert instance.forward(path, intent)
+        assert intents.get(timeout=2) == {
+            'command': 'launch',
+            'accounts': ['main'],
+        }
+        assert not instance.forward(path, {'command': 'quit'})
+        assert not instance.forward(path, {'command': 'launch', 'accounts': 1})
+        assert not instance.forward(path, ['activate'])
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            client.sendall(b'not json\n')
+            assert client.makefile('rb').readline() == b''
+        assert instance.forward(path, {'command': 'activate'})
+        assert intents.get(timeout=2)['command'] == 'activate'
+        assert intents.empty()
+    finally:
+        server.stop()
+
+
+def test_control_server_round_trip(tmp_path):
+    import json
+    import socket
+    import pytest
+    import control
+
+    def dispatcher(command, responses):
+        name = command.get('command')
+        if name == 'crash':
+            raise RuntimeError('boom')
+        if name != 'hang':
+            responses.put({'echo': name})
+            responses.put(control.FINISHED)
+
+    path = str(tmp_path / control.SOCKET_FILENAME)
+    token = control.get_token(str(tmp_path / control.TOKEN_FILENAME))
+    assert control.get_token(str(tmp_path / control.TOKEN_FILENAME)) == token
+    server = control.ControlServer(path, token, dispatcher, timeout=0.2)
+    server.start()
+    try:
+        # Failed and unresponsive commands don't stop the rest of the batch
+        commands = [
+            {'command': 'status'},
+            {'command': 'crash'},
+            {'command': 'hang'},
+            {'command': 'invasions'},
+        ]
+        assert list(control.send(path, token, commands, timeout=5)) == [
+            {'echo': 'status'},
+            {'error': 'boom'},
+            {'error': 'the command timed out'},
+            {'echo': 'invasions'},
+        ]
+        with pytest.raises(ValueError, match='invalid token'):
+            list(control.send(path, 'wrong', commands, timeout=5))
+        with pytest.raises(ValueError, match='list of objects'):
+            list(control.send(path, token, ['status'], timeout=5))
+
+        # Malformed requests are rejected without closing the connection
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(5)
+            client.connect(path)
+            stream = client.makefile('rwb')
+            for line in (b'not json\n', b'[1, 2]\n', b'"token"\n'):
+                stream.write(line)
+                stream.flush()
+                response = json.loads(stream.readline())
+                assert response['done'] and response['error']
+    finally:
+        server.stop()
+
+
+def test_invasion_estimator_keeps_recent_window():
+    import pytest
+    from multitooner import estimator
+
+    predictor = estimator.InvasionEstimator(window=3, min_samples=3)
+    # Only the last three polls count once the window is full
+    for poll, defeated in enumerate([0, 10, 20, 100, 200, 300]):
+        ends = predictor.update(
+            {
+                'Boingy Acres': ('Flunky', f'{defeated}/1000'),
+                'Gulp Gulch': ('Yesman', f'{poll * 10}/100'),
+            },
+            now=1.7e9 + poll,
+        )
+    assert ends['Boingy Acres'] == pytest.approx(1.7e9 + 5 + 7)
+    assert ends['Gulp Gulch'] == pytest.approx(1.7e9 + 10)
+
+    # Districts whose invasions ended free their series for new ones
+    predictor.update({}, now=1.7e9 + 6)
+    for poll in range(3):
+        ends = predictor.update(
+            {'Zoink Falls': ('Tightwad', f'{poll * 5}/100')},
+            now=1.7e9 + 7 + poll,
+        )
+    assert ends == {'Zoink Falls': pytest.approx(1.7e9 + 9 + 18)}
+
+
+def test_configuration_snapshot_opens_real_configuration(tmp_path):
+    import pytest
+    import config
+    import snapshot
+
+    path = str(tmp_path / config.FILENAME)
+    real = config.Configuration({config.FILENAME: path}, config.FILENAME)
+    real.add_account('main', 'user', 'secret')
+    loads = []
+
+    def load():
+        loads.append(path)
+        return real
+
+    state = {'accounts': ['main'], 'settings': {'interval': 30}}
+    provisional = snapshot.ConfigurationSnapshot(state, path, load=load)
+    assert provisional.get_setting('interval') == 30
+    assert provisional.accounts == ['main']
+    assert not loads
+
+    # Anything the snapshot didn't save comes from the real configuration
+    assert provisional.get_account('main') == ('user', 'secret')
+    provisional.set_setting('interval', 90)
+    assert real.get_setting('interval') == 90
+    assert len(loads) == 2
+    with pytest.raises(AttributeError):
+        snapshot.ConfigurationSnapshot(state, path).get_account
+
+
+def test_admission_controller_limits_booting_clients(monkeypatch):
+    import admission
+
+    now = [0.0]
+    load = [0.5]
+    memory = [4096]
+    monkeypatch.setattr(admission.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(admission.os, 'getloadavg', lambda: (load[0], 0, 0))
+    monkeypatch.setattr(admission, 'get_free_memory', lambda: memory[0])
+    controller = admission.AdmissionController(
+        max_booting=2,
+        max_load=4,
+        min_free_memory=512,
+        boot_time=30,
+    )
+
+    # Nothing booting is always admitted, however busy the system is
+    load[0] = 10
+    assert controller.admit()
+    controller.record_spawn()
+
+    # A second client waits for the load and free memory
+    assert not controller.admit()
+    load[0] = 0.5
+    memory[0] = 100
+    assert not controller.admit()
+    memory[0] = None
+    assert controller.admit()
+    memory[0] = 4096
+    controller.record_spawn()
+
+    # No more than two clients boot at once
+    assert controller.booting == 2
+    assert not controller.admit()
+
+    # Clients stop counting as booting once their boot time is up
+    now[0] = 30.5
+    assert controller.booting == 0
+    assert controller.admit()
+
+
+def test_memory_diagnostics_report(tmp_path):
+    import diagnostics
+
+    class Tracked:
+        pass
+
+    tracked = [Tracked() for _ in range(3)]
+    counts = diagnostics.count_objects({
+        'Tracked': lambda o: isinstance(o, Tracked),
+        'Nothing': lambda o: False,
+    })
+    assert counts == {'Tracked': 3, 'Nothing': 0}
+
+    memory = diagnostics.MemoryDiagnostics(
+        predicates={'Tracked': lambda o: isinstance(o, Tracked)},
+        gauges={'Tracked list': lambda: len(tracked)},
+        samples=2,
+    )
+    for _ in range(3):
+        memory.sample()
+    assert len(memory.history) == 2
+    assert all(rss > 0 for _, rss in memory.history)
+
+    # Tracing starts on the first snapshot and compares the ones after
+    try:
+        assert memory.take_snapshot() == []
+        assert memory.tracing
+        tracked.extend(Tracked() for _ in range(1000))
+        assert memory.take_snapshot()
+        memory.dump(str(tmp_path / 'diagnostics.txt'))
+    finally:
+        memory.stop_tracing()
+    report = (tmp_path / 'diagnostics.txt').read_text()
+    assert 'Tracked: 1003' in report and 'Tracked list: 1003' in report
+    assert 'Top allocators:' in report
+    assert 'Allocation tracing is off.' in memory.report()
+
+
+def test_invasion_state_warm_start(tmp_path, monkeypatch):
+    import pytest
+    pytest.importorskip('rumps')
+    import invasions
+
+    path = str(tmp_path / 'invasions.json')
+    assert invasions.load_state(path, max_age=900) == {}
+
+    current = {'Boingy Acres': 'Flunky', 'Gulp Gulch': 'Yesman'}
+    invasions.save_state(path, current)
+    assert invasions.load_state(path, max_age=900) == current
+    assert not (tmp_path / 'invasions.json.tmp').exists()
+
+    # State older than the maximum age is discarded
+    later = invasions.time.time() + 901
+    monkeypatch.setattr(invasions.time, 'time', lambda: later)
+    assert invasions.load_state(path, max_age=900) == {}
+    monkeypatch.undo()
+
+    # So is anything that isn't a saved state
+    for contents in ('not json', '[]', '{"time": 0}', '{"invasions": {}}'):
+        (tmp_path / 'invasions.json').write_text(contents)
+        assert invasions.load_state(path, max_age=900) == {}
+
+
+def test_credential_checker_caches_conclusive_results(monkeypatch):
+    from multitooner import health
+
+    now = [0.0]
+    monkeypatch.setattr(health.time, 'monotonic', lambda: now[0])
+    results = {'good': health.VALID, 'down': health.UNKNOWN}
+    calls = []
+
+    def check(username, password):
+        calls.append(username)
+        if password == 'broken':
+            raise RuntimeError('unexpected response')
+        return results[password]
+
+    checker = health.CredentialChecker(max_workers=1, ttl=60, check=check)
+    reported = []
+    futures = checker.check_all(
+        {'main': ('toon', 'good'), 'alt': ('other', 'down')},
+        lambda name, result: reported.append((name, result)),
+    )
+    assert {name: future.result() for name, future in futures.items()} == {
+        'main': health.VALID,
+        'alt': health.UNKNOWN,
+    }
+    assert sorted(reported) == [('alt', 'unknown'), ('main', 'valid')]
+
+    # Valid results are reused within the TTL, but UNKNOWN isn't cached
+    now[0] = 60
+    assert checker.get_result('main', 'toon', 'good') == health.VALID
+    assert checker.get_result('alt', 'other', 'down') is None
+
+    # Changing the password or waiting out the TTL misses the cache
+    assert checker.get_result('main', 'toon', 'changed') is None
+    now[0] = 61
+    assert checker.get_result('main', 'toon', 'good') is None
+
+    # A check that raises still reports a result, and isn't cached
+    futures = checker.check_all(
+        {'main': ('toon', 'broken')},
+        lambda name, result: reported.append((name, result)),
+    )
+    assert futures['main'].result() == health.UNKNOWN
+    assert reported[-1] == ('main', health.UNKNOWN)
+    assert checker.get_result('main', 'toon', 'broken') is None
+    assert calls == ['toon', 'other', 'toon']
+
+
+def test_install_manifest_cache_and_prewarm(tmp_path, monkeypatch):
+    import os
+    from multitooner import install
+
+    directory = tmp_path / 'Toontown Rewritten'
+    (directory / 'resources').mkdir(parents=True)
+    for name, size in (('phase_3.mf', 3000), ('phase_4.mf', 2000)):
+        (directory / 'resources' / name).write_bytes(b'\0' * size)
+    (directory / 'TTREngine').write_bytes(b'\0' * 1000)
+    cache_path = str(tmp_path / 'install.json')
+    scans = []
+    scan = install.InstallManifest._scan
+
+    def counting_scan(self):
+        scans.append(self.directory)
+        return scan(self)
+
+    monkeypatch.setattr(install.InstallManifest, '_scan', counting_scan)
+    manifest = install.InstallManifest(str(directory), cache_path)
+    files = manifest.files
+    assert files[os.path.join('resources', 'phase_3.mf')][0] == 3000
+    assert len(files) == 3 and len(scans) == 1
+
+    # The cached manifest is reused while no directory changed
+    manifest = install.InstallManifest(str(directory), cache_path)
+    assert manifest.files == files
+    assert len(scans) == 1
+
+    # Adding a file changes its directory's mtime, so the cache is rebuilt
+    (directory / 'resources' / 'phase_5.mf').write_bytes(b'\0' * 500)
+    stat = os.stat(directory / 'resources')
+    os.utime(
+        directory / 'resources',
+        ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9),
+    )
+    files = manifest.files
+    assert os.path.join('resources', 'phase_5.mf') in files
+    assert len(scans) == 2
+
+    # Prewarming skips small files and stops short of its byte budget
+    assert install.prewarm(manifest, min_size=1000) == 6000
+    assert install.prewarm(manifest, min_size=1, budget=4000) == 4000
+    assert install.prewarm(manifest, min_size=1, budget=3500) == 3500
+    assert install.prewarm(manifest, min_size=1, budget=100) == 0
+
+
+def test_integrity_verifier_verifies_and_repairs(tmp_path, monkeypatch):
+    import bz2
+    import hashlib
+    import os
+    import pytest
+    from multitooner import integrity
+
+    directory = tmp_path / 'Toontown Rewritten'
+    (directory / 'resources').mkdir(parents=True)
+    good, fresh = b'phase 3' * 1000, b'phase 4' * 1000
+    (directory / 'resources' / 'phase_3.mf').write_bytes(good)
+    (directory / 'resources' / 'phase_4.mf').write_bytes(b'broken' * 1000)
+    assert integrity.hash_file(directory / 'resources' / 'phase_3.mf') == (
+        hashlib.sha1(good).hexdigest()
+    )
+
+    class Response:
+        def __init__(self, body):
+            self.body = body
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return self.body
+
+        def iter_content(self, size):
+            for start in range(0, len(self.body), size):
+                yield self.body[start:start + size]
+
+    # Only the files that stay inside the installation are kept
+    def entry(data, dl='file.bz2', **fields):
+        return dict(fields, hash=hashlib.sha1(data).hexdigest(), dl=dl)
+
+    files = {
+        'resources/phase_3.mf': entry(good),
+        'resources/phase_4.mf': entry(fresh, dl='phase_4.mf.bz2'),
+        'resources/phase_5.mf': entry(good, only=['win32']),
+        '../escape.mf': entry(good),
+        str(tmp_path / 'absolute.mf'): entry(good),
+        'resources/../../escape.mf': entry(good),
+        'resources/phase_6.mf': entry(good, dl='../phase_6.mf.bz2'),
+    }
+    downloads = {'phase_4.mf.bz2': bz2.compress(fresh)}
+
+    def get(url, **kwargs):
+        if url == integrity.MANIFEST_URL:
+            return Response(files)
+        return Response(downloads[url[len(integrity.PATCHES_URL):]])
+
+    monkeypatch.setattr(integrity.requests, 'get', get)
+    verifier = integrity.IntegrityVerifier(
+        str(directory),
+        str(tmp_path / 'hashes.json'),
+    )
+    manifest = verifier.fetch_manifest()
+    assert sorted(manifest) == ['resources/phase_3.mf', 'resources/phase_4.mf']
+
+    # A malformed manifest is rejected before anything relies on it
+    files['resources/phase_7.mf'] = {'hash': None}
+    with pytest.raises(ValueError):
+        verifier.fetch_manifest()
+
+    # Clean files pass, corrupt ones don't, and unchanged files aren't rehashed
+    hashed = []
+    hash_file = integrity.hash_file
+    monkeypatch.setattr(
+        integrity,
+        'hash_file',
+        lambda path: hashed.append(path) or hash_file(path),
+    )
+    problems = verifier.verify(manifest)
+    assert problems == {'resources/phase_4.mf': integrity.CORRUPT}
+    assert len(hashed) == 2
+    assert verifier.verify(manifest) == problems
+    assert len(hashed) == 2
+
+    # A failed download leaves the original and no partial file behind
+    downloads['phase_4.mf.bz2'] = b'not bz2'
+    assert verifier.repair(manifest, problems) == ['resources/phase_4.mf']
+    assert sorted(os.listdir(directory / 'resources')) == [
+        'phase_3.mf',
+        'phase_4.mf',
+    ]
+    assert (directory / 'resources' / 'phase_4.mf').read_bytes() != fresh
+
+    # A good download replaces the corrupt file
+    downloads['phase_4.mf.bz2'] = bz2.compress(fresh)
+    assert verifier.repair(manifest, problems) == []
+    assert (directory / 'resources' / 'phase_4.mf').read_bytes() == fresh
+    assert verifier.verify(manifest) == {}